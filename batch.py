@@ -0,0 +1,113 @@
+"""Scoring every child of a position at once with NumPy. Every ply is a fixed gather of the board's flat cells with
+the new card appended, an edge insertion moving its line on by one and a setup ply filling its cell, so the children
+of a position are the parent's CompactBoard codes indexed by an (n_plies, size * size) array of cell indices. The
+board scores and positional terms of every owner on every child then come out of one product with the cell weights.
+
+NumPy is optional. Without it AVAILABLE is False and curling.one_set_ai, AIGreedyPlayer and AITreeSearch play each
+ply on the board and score it, which gives the same results."""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+import curling2
+from curling2 import BLANK, POSITIONAL_SCALE, RANK_INDEX, RANK_VALUES, RANKS
+
+AVAILABLE = np is not None
+
+
+def _cell_tables(size):
+    """(gathers, rows, weights): gathers holds in row rows[row, column] the flat cells each cell takes its card from
+    after that ply, size * size standing for the new card, and weights holds per flat cell its score weight and its
+    positional weight in two rows"""
+    n_cells = size * size
+    gathers = {}
+    for (row, column), ((kind, i), _, gather) in curling2.insertion_table(size).items():
+        if kind == 'row':
+            line = [i * size + j for j in range(size)]
+        else:
+            line = [j * size + i for j in range(size)]
+        index = list(range(n_cells))
+        for cell, source in zip(line, gather(line + [n_cells])):
+            index[cell] = source
+        gathers[row, column] = index
+    for cell in range(n_cells):
+        index = list(range(n_cells))
+        index[cell] = n_cells
+        gathers[cell // size + 1, cell % size + 1] = index
+    joker = size // 2
+    weights = np.zeros((2, n_cells), dtype=np.int64)
+    for x, y in ((joker - 1, joker - 1), (joker - 1, joker + 1), (joker + 1, joker - 1), (joker + 1, joker + 1)):
+        weights[0, x * size + y] = 1
+    for x, y in ((joker - 1, joker), (joker, joker - 1), (joker + 1, joker), (joker, joker + 1)):
+        weights[0, x * size + y] = 2
+    for (x, y), weight in curling2.positional_weights(size).items():
+        weights[1, x * size + y] = weight
+    return np.array(list(gathers.values())), {key: i for i, key in enumerate(gathers)}, weights
+
+
+def _owned_values(n_players):
+    """Per code, the card's value in its owner's column of an (n_codes, n_players) array"""
+    out = np.zeros((BLANK + 1 + n_players * len(RANKS), n_players), dtype=np.int64)
+    for seat in range(n_players):
+        start = BLANK + 1 + seat * len(RANKS)
+        out[start:start + len(RANKS), seat] = RANK_VALUES
+    return out
+
+
+def player_code(card, seat):
+    """CompactBoard code of a player's card, numbering owners by seat as Board.codes does"""
+    return BLANK + 1 + seat * len(RANKS) + RANK_INDEX[card.name]
+
+
+def children(codes, size, plies):
+    """Codes of the board after each of plies, as an (n_plies, size, size) array. codes are the board's flat codes
+    and plies (code, row, column), row and column an empty cell or an edge insertion as in Ply, all legal"""
+    n_cells = size * size
+    gathers, rows, _ = curling2.shared_table(('batch', size), lambda: _cell_tables(size))
+    # The new cards go after the board's cells, one slot per distinct code
+    slots = {}
+    for code, _, _ in plies:
+        slots.setdefault(code, n_cells + len(slots))
+    index = gathers[[rows[row, column] for _, row, column in plies]]
+    new = np.array([slots[code] for code, _, _ in plies])
+    index = np.where(index == n_cells, new[:, None], index)
+    return np.array(codes + list(slots))[index].reshape(len(plies), size, size)
+
+
+def scores(boards, n_players):
+    """(board scores, positional terms) of each owner on each of boards, as from children: two (n_boards, n_players)
+    arrays, what Board.score and Board.positional give"""
+    n_boards, size, _ = boards.shape
+    _, _, weights = curling2.shared_table(('batch', size), lambda: _cell_tables(size))
+    values = curling2.shared_table(('batch values', n_players), lambda: _owned_values(n_players))
+    # (n_boards, 2, n_players): each weight row times each owner's values on the cells
+    both = weights @ values[boards.reshape(n_boards, -1)]
+    return both[:, 0], both[:, 1]
+
+
+def greedy_scores(codes, size, plies, n_players, p_turn):
+    """Board score of p_turn over everyone else's, 2 * own - total, after each of plies, as a list"""
+    board_scores, _ = scores(children(codes, size, plies), n_players)
+    return (2 * board_scores[:, p_turn] - board_scores.sum(axis=1)).tolist()
+
+
+def child_values(game, p_turn, alter_scores, plies):
+    """AITreeSearch.heuristic_eval of the position after each of p_turn's plies, as test_move would leave it, in a
+    list of {player: value}. None if the plies end the game, which heuristic_eval values on the final scores"""
+    players = game.players
+    n_players = len(players)
+    next_turn = (p_turn + 1) % n_players
+    if n_players == 1 or not players[next_turn].hand:
+        return None
+    size = game.board.size
+    boards = children(game.board.codes(players), size, [(player_code(ply.card, p_turn), ply.row, ply.column)
+                                                        for ply in plies])
+    board_scores, positional = scores(boards, n_players)
+    totals = np.array([player.score + alter_scores[player] for player in players])
+    wait = (np.arange(n_players) - next_turn) % n_players
+    values = POSITIONAL_SCALE * (totals + board_scores * (1 + n_players - wait)) + positional
+    # test_move scores the board for the player to play next
+    values[:, next_turn] += POSITIONAL_SCALE * board_scores[:, next_turn]
+    values = (2 * values - values.sum(axis=1, keepdims=True)) / POSITIONAL_SCALE
+    return [dict(zip(players, row)) for row in values.tolist()]
@@ -0,0 +1,263 @@
+"""Micro-benchmarks of the engine hot paths on fixed seeded positions, with a JSON report that can be saved and
+compared against later runs:
+
+    python bench.py --save before.json
+    python bench.py --baseline before.json
+
+Board cases run on curling.Board, curling2.Board and curling2.CompactBoard. The cases that need a curling2 Game
+(enum_plies, test_move, heuristic_eval, tree_search) run on the two curling2 boards, as curling.py has no Game.
+
+Recorded runs of the running scores the curling2 boards keep for score and heuristic_eval, best of three in us on
+seed 0: before the boards kept them (and before the tables added since), updating every rated cell of the moved line
+out and back in, and updating only the rated cells whose card changed. The setup update still rates its one cell:
+
+                              update_row  update_column  update_joker_row  update_setup  score  heuristic_eval
+    curling2.Board
+      no running scores             1.10           3.08              1.18          2.56   1.86            6.75
+      every rated cell              5.05           6.33              4.18          4.23   0.47            1.59
+      changed cells only            2.49           3.58              2.69          4.74   0.56            1.88
+    curling2.CompactBoard
+      no running scores             0.78           0.87              0.74          1.66   1.71            8.05
+      every rated cell              2.78           2.78              2.42          2.47   0.51            2.04
+      changed cells only            1.99           1.82              1.85          2.71   0.53            1.69
+"""
+import argparse
+import contextlib
+import io
+import json
+import platform
+import random
+import sys
+import time
+import timeit
+
+import curling
+import curling2
+
+SUITS = [chr(9829), chr(9830), chr(9827)]
+BOARDS = ['curling.Board', 'curling2.Board', 'curling2.CompactBoard']
+# Plies played from the start for each position: the setup phase, a full board mid game and the last round
+POSITIONS = {'opening': 4, 'midgame': 18, 'endgame': 33}
+
+
+def game_plies(seed, n):
+    """First n plies, as (card name, row, column), of a random curling2 game seeded with seed"""
+    random.seed(seed)
+    players = [curling2.AIPlayer('P{}'.format(i), suit) for i, suit in enumerate(SUITS)]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0,
+                         autostart=False)
+    out = []
+    for _ in range(n):
+        player = game.players[game.p_turn]
+        ply = player.make_move(game.get_game_state())
+        out.append((ply.card.name, ply.row, ply.column))
+        game.make_move(ply)
+    return out
+
+
+def curling_position(plies):
+    """curling.Board and players after plies"""
+    board = curling.Board()
+    players = [curling.Player('P{}'.format(i), suit) for i, suit in enumerate(SUITS)]
+    for i, (name, row, column) in enumerate(plies):
+        player = players[i % len(players)]
+        card = player.in_hand(name)
+        player.play(card)
+        board.update(card, row, column)
+    return board, players
+
+
+def curling2_position(board_name, plies):
+    """curling2 Game, not started, after plies on a board_name board"""
+    board = curling2.Board() if board_name == 'curling2.Board' else curling2.CompactBoard()
+    players = [curling2.Player('P{}'.format(i), suit) for i, suit in enumerate(SUITS)]
+    for player in players:
+        player.AI = True
+    game = curling2.Game(curling2.StartGameState(board, players), save=0, load=0, autostart=False)
+    for name, row, column in plies:
+        game.make_move(curling2.Ply(game.players[game.p_turn].in_hand(name), row, column))
+    return game
+
+
+def position(board_name, plies):
+    """(board, players, game) for plies on board_name, game being None for curling.Board"""
+    if board_name == 'curling.Board':
+        return curling_position(plies) + (None,)
+    game = curling2_position(board_name, plies)
+    return game.board, game.players, game
+
+
+def update_case(row, column, phase):
+    """Board.update inserting from row, column. curling2 boards are updated with test=True, as the search does;
+    setup phase inserts are taken back after each one so the cell stays empty"""
+    def case(board_name, positions):
+        board, players, game = position(board_name, positions[phase])
+        card = players[0].hand[0]
+        if board_name == 'curling.Board':
+            if phase == 'opening':
+                r, c = board.get_empty()[0]
+
+                def f():
+                    board.update(card, r, c)
+                    board._cards[r - 1][c - 1] = ''
+                return f
+            return lambda: board.update(card, row, column)
+        if phase == 'opening':
+            r, c = board.get_empty()[0]
+            ply = curling2.Ply(card, r, c)
+            return lambda: board.unmake_move(board.make_move(ply)[0])
+        ply = curling2.Ply(card, row, column)
+        return lambda: board.update(ply, test=True)
+    return case
+
+
+def score_case(board_name, positions):
+    board, players, game = position(board_name, positions['midgame'])
+    if board_name == 'curling.Board':
+        return lambda: [board.score(player.suit) for player in players]
+    return lambda: [board.score(player) for player in players]
+
+
+def get_empty_case(board_name, positions):
+    board, players, game = position(board_name, positions['opening'])
+    return board.get_empty
+
+
+def enum_plies_case(board_name, positions):
+    board, players, game = position(board_name, positions['midgame'])
+    return lambda: list(curling2.Player.enum_plies(game, game.p_turn))
+
+
+def test_move_case(board_name, positions):
+    """test_move and untest_move of one ply"""
+    board, players, game = position(board_name, positions['midgame'])
+    alter_scores = {player: 0 for player in players}
+    ply = next(curling2.Player.enum_plies(game, game.p_turn))
+
+    def f():
+        token = game.test_move(ply, game.p_turn, alter_scores.copy())[3]
+        game.untest_move(token)
+    return f
+
+
+def heuristic_eval_case(board_name, positions):
+    board, players, game = position(board_name, positions['midgame'])
+    alter_scores = {player: 0 for player in players}
+    return lambda: curling2.AITreeSearch.heuristic_eval(game, alter_scores, game.p_turn, 0)
+
+
+def tree_search_case(depth, phase):
+    """AITreeSearch.tree_search without a transposition table, so every repeat searches the whole tree"""
+    def case(board_name, positions):
+        board, players, game = position(board_name, positions[phase])
+        alter_scores = {player: 0 for player in players}
+        searcher = curling2.AITreeSearch('bench', '', depth, table_size=0)
+
+        def f():
+            random.seed(0)
+            searcher.tree_search(game, depth, game.p_turn, alter_scores)
+        return f
+    return case
+
+
+# name: (case, boards it runs on). A case takes the board name and the positions' plies and returns the callable
+# to time
+CASES = {
+    'update_row': (update_case(1, 0, 'midgame'), BOARDS),
+    'update_column': (update_case(0, 2, 'midgame'), BOARDS),
+    'update_joker_row': (update_case(3, 0, 'midgame'), BOARDS),
+    'update_setup': (update_case(None, None, 'opening'), BOARDS),
+    'score': (score_case, BOARDS),
+    'get_empty': (get_empty_case, BOARDS),
+    'enum_plies': (enum_plies_case, BOARDS[1:]),
+    'test_move': (test_move_case, BOARDS[1:]),
+    'heuristic_eval': (heuristic_eval_case, BOARDS[1:]),
+    'tree_search_1': (tree_search_case(1, 'midgame'), BOARDS[1:]),
+    'tree_search_2': (tree_search_case(2, 'midgame'), BOARDS[1:]),
+    'tree_search_3': (tree_search_case(3, 'endgame'), BOARDS[1:]),
+}
+
+
+def measure(f, repeat=3, min_time=0.2):
+    """Seconds per call of f: the best of repeat runs, each of enough calls to take min_time"""
+    timer = timeit.Timer(f)
+    number = 1
+    while True:
+        t = timer.timeit(number)
+        if t >= min_time or number >= 10 ** 7:
+            break
+        number = max(number * 2, int(number * min_time / t * 1.1) if t else number * 10)
+    times = [t] + timer.repeat(repeat - 1, number)
+    return {'number': number, 'best': min(times) / number, 'mean': sum(times) / len(times) / number}
+
+
+def run(cases=None, boards=None, seed=0, repeat=3, min_time=0.2):
+    """Report of every case on every board it supports, or only the named ones"""
+    positions = {phase: game_plies(seed, n) for phase, n in POSITIONS.items()}
+    results = {}
+    for name, (case, case_boards) in CASES.items():
+        if cases and name not in cases:
+            continue
+        for board_name in case_boards:
+            if boards and board_name not in boards:
+                continue
+            # AITreeSearch prints and switches printing on, so keep it out of the report
+            with contextlib.redirect_stdout(io.StringIO()):
+                curling.PRINT = False
+                curling2.PRINT = False
+                f = case(board_name, positions)
+                results['{} {}'.format(name, board_name)] = measure(f, repeat, min_time)
+    return {'time': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'seed': seed,
+            'results': results}
+
+
+def compare(report, baseline):
+    """Lines of each result's time against the baseline's, as a ratio (below 1 is faster)"""
+    lines = ['{:<40} {:>12} {:>12} {:>7}'.format('case', 'baseline', 'now', 'ratio')]
+    for key, result in report['results'].items():
+        before = baseline['results'].get(key)
+        if before is None:
+            lines.append('{:<40} {:>12} {:>12} {:>7}'.format(key, '-', format_time(result['best']), '-'))
+        else:
+            lines.append('{:<40} {:>12} {:>12} {:>7.2f}'.format(key, format_time(before['best']),
+                                                                 format_time(result['best']),
+                                                                 result['best'] / before['best']))
+    return '\n'.join(lines)
+
+
+def format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{:.3g} {}'.format(seconds / scale, unit)
+    return '{:.3g} ns'.format(seconds / 1e-9)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks the curling engines')
+    parser.add_argument('cases', nargs='*', help='case names to run, all by default: {}'.format(', '.join(CASES)))
+    parser.add_argument('--board', action='append', choices=BOARDS, help='only run on this board')
+    parser.add_argument('--seed', type=int, default=0, help='seed of the game the positions come from')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--min-time', type=float, default=0.2, help='seconds each repeat runs for at least')
+    parser.add_argument('--save', help='write the JSON report to this file')
+    parser.add_argument('--baseline', help='JSON report to compare against')
+    args = parser.parse_args(argv)
+    for name in args.cases:
+        if name not in CASES:
+            parser.error('Unknown case {}'.format(name))
+
+    report = run(args.cases, args.board, args.seed, args.repeat, args.min_time)
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            print(compare(report, json.load(f)))
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    return report
+
+
+if __name__ == '__main__':
+    main()
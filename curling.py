@@ -1,5 +1,10 @@
-import pickle
+import atexit
+import copy
 import random
+import threading
+from collections import OrderedDict
+
+from insertions import insertion_table
 
 
 PRINT = False
@@ -91,7 +96,8 @@ class Board:
         """Starting from the outside left as column 0, top as row 0, place your card outisde the space you want to
         insert it, e.g. 0, 2 to insert from the left into the second row"""
         error = ''
-        if any(not x for row in self._cards for x in row):
+        # Empty cells hold '', so this finds them without testing every card
+        if any('' in card_row for card_row in self._cards):
             l = self.get_empty()
             if (row, column) not in l:
                 if PRINT:
@@ -104,66 +110,21 @@ class Board:
             # Return is important here
             return discarded, error
 
-        if 0 < row <= self.size:
-            card_row = self._cards[row - 1]
-            if column == 0:
-                discarded = card_row[-1]
-                if row == self.joker_pos + 1:
-                    new_row = [card] + card_row[:self.joker_pos - 1] + [self.joker] + [card_row[self.joker_pos - 1]] \
-                              + card_row[self.joker_pos + 1:-1]
-                else:
-                    new_row = [card] + card_row[:-1]
-            elif column == self.size + 1:
-                discarded = card_row[0]
-                if row == self.joker_pos + 1:
-                    new_row = card_row[1:self.joker_pos] + [card_row[self.joker_pos + 1]] + [self.joker] + \
-                              card_row[self.joker_pos + 2:] + [card]
-                else:
-                    new_row = card_row[1:] + [card]
-            else:
-                discarded = ''
-                if PRINT:
-                    print('Invalid row/column')
-                error = 'Invalid row/column'
-            if discarded:
-                # noinspection PyUnboundLocalVariable
-                self._cards[row - 1] = new_row
-        elif 0 < column <= self.size:
-            if row == 0:
-                discarded = self._cards[self.size - 1][column - 1]
-                if column == self.joker_pos + 1:
-                    # Move cards down one row
-                    for i, card_row in enumerate(self._cards[:self.joker_pos + 1:-1], start=2):
-                        card_row[column - 1] = self._cards[self.size - i][column - 1]
-                    self._cards[self.size - i][column - 1] = self._cards[self.size - i - 2][column - 1]  # Skip joker
-                    for i, card_row in enumerate(self._cards[self.joker_pos - 1:0:-1], start=i + 3):
-                        card_row[column - 1] = self._cards[self.size - i][column - 1]
-                else:
-                    for i, card_row in enumerate(self._cards[:0:-1], start=2):  # Move cards down one row
-                        card_row[column - 1] = self._cards[self.size - i][column - 1]
-                self._cards[0][column - 1] = card
-            elif row == self.size + 1:
-                discarded = self._cards[self.size - 1][0]
-                if column == self.joker_pos + 1:
-                    for i, card_row in enumerate(self._cards[:self.joker_pos - 1], start=1):  # Move cards up one row
-                        card_row[column - 1] = self._cards[i][column - 1]
-                    self._cards[i][column - 1] = self._cards[i + 2][column - 1]  # Skip joker
-                    for i, card_row in enumerate(self._cards[self.joker_pos + 1:-1], start=i + 3):
-                        card_row[column - 1] = self._cards[i][column - 1]
-                else:
-                    for i, card_row in enumerate(self._cards[:-1], start=1):  # Move cards up one row
-                        card_row[column - 1] = self._cards[i][column - 1]
-                self._cards[self.size - 1][column - 1] = card
-            else:
-                discarded = ''
-                if PRINT:
-                    print('Invalid row/column')
-                error = 'Invalid row/column'
-        else:
+        insertion = insertion_table(self.size).get((row, column))
+        if insertion is None:
             if PRINT:
                 print('Invalid row/column')
             error = 'Invalid row/column'
-            discarded = ''
+            return '', error
+        (kind, index), pushed, gather = insertion
+        if kind == 'row':
+            cards = self._cards[index] + [card]
+            self._cards[index] = list(gather(cards))
+        else:
+            cards = [card_row[index] for card_row in self._cards] + [card]
+            for card_row, moved in zip(self._cards, gather(cards)):
+                card_row[index] = moved
+        discarded = cards[pushed]
         if discarded:
             discarded.discarded = True  # Set card attribute
         return discarded, error
@@ -228,23 +189,98 @@ class Player:
             return '{} ({})'.format(self.name, self.suit)
 
 
-def dump(board, players, discarded, p_turn, statement, fname):
+class SessionStore:
+    """Games held in memory by file name, so turn() and information() calls skip the disk. Past capacity games the
+    least recently used is dropped. Saves are write-behind: put encodes the game at once but the file is only written
+    delay seconds later, or on eviction, flush and exit"""
+    def __init__(self, capacity=64, delay=1.0):
+        self.capacity = capacity
+        self.delay = delay
+        self._games = OrderedDict()  # fname: game tuple, most recently used last
+        self._dirty = {}  # fname: encoded game not yet written
+        self._lock = threading.RLock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def get(self, fname):
+        with self._lock:
+            data = self._games.get(fname)
+            if data is None:
+                data = read_save(fname)
+                self._add(fname, data)
+            else:
+                self._games.move_to_end(fname)
+            return data
+
+    def put(self, fname, data):
+        import savefile
+        encoded = savefile.dumps_curling(*data)
+        with self._lock:
+            self._add(fname, data)
+            self._dirty[fname] = encoded
+            if self._timer is None:
+                self._timer = threading.Timer(self.delay, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+
+    def _add(self, fname, data):
+        self._games[fname] = data
+        self._games.move_to_end(fname)
+        while len(self._games) > self.capacity:
+            old, _ = self._games.popitem(last=False)
+            if old in self._dirty:
+                write_save(old, self._dirty.pop(old))
+
+    def flush(self):
+        """Writes every game saved since the last flush"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            dirty, self._dirty = self._dirty, {}
+            for fname, encoded in dirty.items():
+                write_save(fname, encoded)
+
+    def drop(self, fname):
+        """Writes fname if needed and forgets it, e.g. before another process changes the file"""
+        with self._lock:
+            if fname in self._dirty:
+                write_save(fname, self._dirty.pop(fname))
+            self._games.pop(fname, None)
+
+
+# The games behind dump and load. Set to None to read and write the file on every call
+SESSIONS = SessionStore()
+
+
+def write_save(fname, encoded):
     with open(fname, 'wb') as f:
-        pickle.dump(board, f)
-        pickle.dump(players, f)
-        pickle.dump(discarded, f)
-        pickle.dump(p_turn, f)
-        pickle.dump(statement, f)
+        f.write(encoded)
 
 
-def load(fname):
+def read_save(fname):
+    """Game tuple from a binary save. Pickle saves are not loaded, see savefile.convert"""
+    import savefile
     with open(fname, 'rb') as f:
-        board = pickle.load(f)
-        players = pickle.load(f)
-        discarded = pickle.load(f)
-        p_turn = pickle.load(f)
-        statement = pickle.load(f)
-    return board, players, discarded, p_turn, statement
+        data = f.read()
+    savefile.check_binary(data, fname)
+    return savefile.loads_curling(data)
+
+
+def dump(board, players, discarded, p_turn, statement, fname):
+    """Saves in the binary format of savefile.py, through SESSIONS"""
+    import savefile
+    if SESSIONS is not None:
+        SESSIONS.put(fname, (board, players, discarded, p_turn, statement))
+    else:
+        write_save(fname, savefile.dumps_curling(board, players, discarded, p_turn, statement))
+
+
+def load(fname):
+    """The game saved as fname. Through SESSIONS this is the session's own objects, so changes should be dumped"""
+    if SESSIONS is not None:
+        return SESSIONS.get(fname)
+    return read_save(fname)
 
 
 def setup(fname='curling.pi', save=1):
@@ -263,17 +299,19 @@ def setup(fname='curling.pi', save=1):
 
 def information(fname='curling.pi'):
     board, players, discarded, p_turn, statement = load(fname)
+    ai_turns = 0
+    # Play the AI turns until a human is next
+    while any(x.hand for x in players) and players[p_turn].ai:
+        random_ai_turn(players[p_turn], board, players, discarded, p_turn, statement, fname=fname)
+        board, players, discarded, p_turn, statement = load(fname)
+        ai_turns += 1
     if not any(x.hand for x in players):
-        statement = final(fname)
-    elif players[p_turn].ai:
-        random_ai_turn(players[p_turn], board, players, discarded, p_turn, statement)
-        # For more ai
-        information(fname)
+        final(fname)
         board, players, discarded, p_turn, statement = load(fname)
-        if PRINT:
-            print(board)
-            print('\n'.join('{}: {}'.format(player, player.score) for player in players))
-            print(statement)
+    if ai_turns and PRINT:
+        print(board)
+        print('\n'.join('{}: {}'.format(player, player.score) for player in players))
+        print(statement)
 
     return board, '\n'.join('{}: {}'.format(player, player.score) for player in players), statement
 
@@ -291,7 +329,8 @@ def turn(card, row, column, save=1, fname='curling.pi', data=None):
     if data:
         board, players, discarded, p_turn, statement = data
     else:
-        board, players, discarded, p_turn, statement = load(fname)
+        # Unsaved, the session's game must not be changed
+        board, players, discarded, p_turn, statement = load(fname) if save else copy.deepcopy(load(fname))
     player = players[p_turn]
     # #print('Statement')
     # while 1:
@@ -336,7 +375,8 @@ def turn(card, row, column, save=1, fname='curling.pi', data=None):
 
 def final(fname='curling.pi', data=None, save=1):
     if not data:
-        data = load(fname)
+        # Unsaved, the session's game must not be finalised
+        data = load(fname) if save else copy.deepcopy(load(fname))
     board, players, discarded, p_turn, statement = data
     if not board.final:
         if PRINT:
@@ -382,7 +422,7 @@ def text_turn(player, board, players, discarded, p_turn, statement):
 
 
 # Random AI
-def random_ai_turn(player, board, players, discarded, p_turn, statement, save=1):
+def random_ai_turn(player, board, players, discarded, p_turn, statement, save=1, fname='curling.pi'):
     if player.hand:
         # card = random.choice(player.hand)
         card = max(player.hand, key=lambda x: x.value)
@@ -422,12 +462,22 @@ def random_ai_turn(player, board, players, discarded, p_turn, statement, save=1)
             column = random.choice((0, board.size + 1))
             row = random.randint(min_choice, max_choice)
 
-    message = turn(card, row, column, save=save, data=[board, players, discarded, p_turn, statement])
+    message = turn(card, row, column, save=save, fname=fname, data=[board, players, discarded, p_turn, statement])
     if message != "Done":
         raise Exception("ai error")
 
 
-def one_set_ai(player, board, players, discarded, p_turn, statement, save=1):
+def one_set_ai(player, board, players, discarded, p_turn, statement, save=1, fname='curling.pi', book=False):
+    if book:
+        import openings
+        found = openings.curling_ply(board, players, p_turn)
+        if found is not None:
+            card, row, column = found
+            message = turn(card, row, column, save=save, fname=fname,
+                           data=[board, players, discarded, p_turn, statement])
+            if message != "Done":
+                raise Exception("ai error")
+            return
     ai_board = AiBoard(board)
     suits = [p.suit for p in players]
     if player.hand:
@@ -446,19 +496,29 @@ def one_set_ai(player, board, players, discarded, p_turn, statement, save=1):
     else:
         choices = [(0, i + 1) for i in range(board.size)] + [(6, i + 1) for i in range(board.size)] + \
                   [(i + 1, 0) for i in range(board.size)] + [(i + 1, 6) for i in range(board.size)]
+    plies = [(card, r, c) for card in cards for r, c in choices]
+    import batch
+    if batch.AVAILABLE:
+        # Every ply scored at once, on the board's codes
+        import savefile
+        scored = batch.greedy_scores([savefile.curling_code(cell, suits) for row in board.cards for cell in row],
+                                     board.size, [(savefile.curling_code(card, suits), r, c) for card, r, c in plies],
+                                     len(players), p_turn)
+    else:
+        scored = []
+        for card, r, c in plies:
+            scores = ai_board.test(board, card, r, c, suits)
+            scored.append(2 * scores[p_turn] - sum(scores))
     best = [(cards[0], choices[0][0], choices[0][1])]
     best_score = 0
-    for card in cards:
-        for r, c in choices:
-            scores = ai_board.test(board, card, r, c, suits)
-            score = 2 * scores[p_turn] - sum(scores)
-            if score > best_score:
-                best = [(card, r, c)]
-                best_score = score
-            elif score == best_score:
-                best.append((card, r, c))
+    for ply, score in zip(plies, scored):
+        if score > best_score:
+            best = [ply]
+            best_score = score
+        elif score == best_score:
+            best.append(ply)
     card, row, column = random.choice(best)
-    message = turn(card, row, column, save=save, data=[board, players, discarded, p_turn, statement])
+    message = turn(card, row, column, save=save, fname=fname, data=[board, players, discarded, p_turn, statement])
     if message != "Done":
         raise Exception("ai error")
 
@@ -498,40 +558,11 @@ def main(ai=(0, 0, 0), gm=(0, 0, 0), fname='curling.pi'):
     return [p.score for p in players]
 
 
-def averages(runs, gm=(0, 0, 0)):
-    global PRINT
-    PRINT = False
-    results = []
-    for _ in range(runs):
-        results.append(main((1, 1, 1), gm))
-
-    end = [0, 0, 0]
-    diff = [0, 0, 0]
-    av_m = []
-    for a, b, c in results:
-        m = max(a, b, c)
-        if a == m:
-            end[0] += 1
-        if b == m:
-            end[1] += 1
-        if c == m:
-            end[2] += 1
-
-        diff[0] += a - b
-        diff[1] += b - c
-        diff[2] += c - a
-        av_m.append(m)
-
-    print("Wins", end)
-    print("Av score")
-    for i in range(3):
-        diff[i] /= runs
-    for i in range(len(results[0])):
-        print(sum(x[i] for x in results) / runs)
-
-    print("Margins:", diff)
-    print("Av winning score:", sum(av_m) / runs)
-    print()
+def averages(runs, gm=(0, 0, 0), workers=None, seed=0):
+    """Plays runs seeded games over a process pool, see tournament.py. A falsy gm is the one_set_ai player"""
+    import tournament
+    lineup = [g if g else 'greedy' for g in gm]
+    return tournament.tournament(lineup, runs, workers=workers, seed=seed, engine='curling')
 
 
 if __name__ == '__main__':
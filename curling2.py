@@ -1,12 +1,25 @@
-import pickle
+import atexit
+import math
+import os
 import random
+import struct
 # import copy
 import time
+from concurrent.futures import ProcessPoolExecutor
+
+from insertions import insertion_table
 
 PRINT = True
+DEBUG = False  # Cross-check incrementally maintained board scores against a full rescan
+POSITIONAL_SCALE = 10  # Board.positional counts in tenths of a point, so it can be kept exactly as an int
 
 
 class Card:
+    """A card's identity (name, value, suit and owner) is fixed once made. Each player holds the only instances of
+    their cards and every board shares FILLER_CARD, so played, only set on a player's cards as they leave the hand,
+    is the only state that changes. Which cards are on the board is kept by the board"""
+    __slots__ = ('name', 'value', 'suit', 'played', 'player')
+
     def __init__(self, name, suit, player=None):
         self.name = str(name)
         if self.name == '10':
@@ -21,34 +34,128 @@ class Card:
             self.value = int(name)
         self.suit = suit
         self.played = False
-        self.discarded = False
         self.player = player
 
+    def __setstate__(self, state):
+        # Pickles from before __slots__ hold the instance __dict__, later ones (None, slot values). Older ones have a
+        # discarded flag, now the board's to know
+        if isinstance(state, tuple):
+            state = dict(state[0] or {}, **state[1])
+        state.pop('discarded', None)
+        for key, value in state.items():
+            setattr(self, key, value)
+
     def __repr__(self):
         return '{} {}'.format(self.name, self.suit)
 
 
 class Joker(Card):
+    __slots__ = ()
+
     def __init__(self):
         super().__init__('Jkr', '')
         self.played = True
-        self.discarded = False
 
     def __repr__(self):
         return self.name
 
 
 class BlankCard(Card):
+    __slots__ = ('pos',)
+
     def __init__(self, pos):
         super().__init__(' ', ' ')
         self.played = True
-        self.discarded = False
         self.pos = pos
 
     def __bool__(self):
         return False
 
 
+FILLER_CARD = Card('*', '*')  # The cells outside play, on every board
+
+
+_zobrist_keys = {}
+
+
+def zobrist_key(cell, suit, name):
+    """Random 64 bit key for a card on a flat cell index (-1 for in a hand), the same in every process"""
+    key = _zobrist_keys.get((cell, suit, name))
+    if key is None:
+        key = _zobrist_keys[cell, suit, name] = random.Random('{} {} {}'.format(cell, suit, name)).getrandbits(64)
+    return key
+
+
+_shared_tables = {}
+
+
+def shared_table(key, build):
+    """build(), made once per key and shared by every board: for the tables that only depend on the board size, and
+    the suits for zobrist keys"""
+    table = _shared_tables.get(key)
+    if table is None:
+        table = _shared_tables[key] = build()
+    return table
+
+
+def zobrist_row(size, suit, name):
+    """Zobrist keys of a card on each flat cell of a size board"""
+    return shared_table(('zobrist', size, suit, name), lambda: [zobrist_key(i, suit, name) for i in range(size * size)])
+
+
+def positional_weights(size):
+    """Weight in 1/POSITIONAL_SCALE points of each cell in AITreeSearch.heuristic_eval's positional term: a card's
+    value counts 0.2 on a corner and 0.5 on a central cell of an outer row or column, and these add up where they
+    meet, as on a size 3 board"""
+    weights = {}
+    central = (size // 2 - 1, size // 2, size // 2 + 1)
+    edges = [0, size - 1]
+    cells = [(r, c, 2) for r in edges for c in edges] + [(r, c, 5) for r in edges for c in central] + \
+            [(r, c, 5) for c in edges for r in central]
+    for r, c, weight in cells:
+        if 0 <= r < size and 0 <= c < size:
+            weights[r, c] = weights.get((r, c), 0) + weight
+    return weights
+
+
+def corner_twins(board):
+    """Edge plies that leave the same board as an earlier one in Player.enum_plies order. Only insertions at the same
+    corner can: if the corner's row and column hold nothing but filler cards, inserting into either puts the card on
+    the corner and moves filler on, so the row insertion is dropped for the column one"""
+    size = board.size
+    out = []
+    for row, column in ((0, 0), (0, size - 1), (size - 1, 0), (size - 1, size - 1)):
+        if all(board.card_at(row, c).name == '*' for c in range(size)) and \
+                all(board.card_at(r, column).name == '*' for r in range(size)):
+            out.append((row + 1, 0 if column == 0 else size + 1))
+    return out
+
+
+_dihedral_maps = {}
+INVERSE_SYMMETRY = [0, 3, 2, 1, 4, 5, 6, 7]  # The rotations by 90 and 270 degrees undo each other, the rest themselves
+
+
+def dihedral_maps(size):
+    """Symmetries of the square board, the identity first, as pairs of the flat cell each cell goes to and a dict of
+    the (row, column) each ply goes to, on the cells for setup plies and on the edges for insertions. The default
+    blanks, the scoring cells and the joker are unchanged by all 8, and any position plays the same as its images.
+    An even size has no central joker, so only the identity"""
+    maps = _dihedral_maps.get(size)
+    if maps is None:
+        m = size + 1
+        transforms = [lambda r, c: (r, c), lambda r, c: (c, m - r), lambda r, c: (m - r, m - c),
+                      lambda r, c: (m - c, r), lambda r, c: (r, m - c), lambda r, c: (m - r, c),
+                      lambda r, c: (c, r), lambda r, c: (m - c, m - r)]
+        maps = []
+        for f in transforms[:8 if size % 2 else 1]:
+            plies = {(r, c): f(r, c) for r in range(size + 2) for c in range(size + 2)}
+            cells = [(plies[x + 1, y + 1][0] - 1) * size + plies[x + 1, y + 1][1] - 1
+                     for x in range(size) for y in range(size)]
+            maps.append((cells, plies))
+        _dihedral_maps[size] = maps
+    return maps
+
+
 class Board:
     def __init__(self, size=5, empty='Default'):
         self._final = 0
@@ -56,7 +163,7 @@ class Board:
         self.joker = Joker()
         self._cards = []
         for _ in range(size):
-            self._cards.append([Card('*', '*')] * size)
+            self._cards.append([FILLER_CARD] * size)
         self.joker_pos = size // 2
         self._cards[self.joker_pos][self.joker_pos] = self.joker
         if empty == 'Default':
@@ -70,6 +177,40 @@ class Board:
                                  (self.joker_pos + 1, self.joker_pos - 1), (self.joker_pos + 1, self.joker_pos + 1)]),
                             (2, [(self.joker_pos - 1, self.joker_pos), (self.joker_pos, self.joker_pos - 1),
                                  (self.joker_pos + 1, self.joker_pos), (self.joker_pos, self.joker_pos + 1)])]
+        # Running score and positional term per card owner, adjusted by update for the scoring or positional cells
+        # of the row or column that moved
+        self._weights, self._scoring_lines = shared_table(('Board', size), self._tables)
+        self._scores = {}
+        self._positional = {}
+        # Zobrist keys of each card on every cell, and the hash of the position, worked out when first asked for
+        # after a move so searches without a transposition table never pay for it
+        self._zobrist_rows = shared_table(('Board zobrist', size), dict)
+        self._hash = None
+        self.symmetries = dihedral_maps(size)
+
+    def __setstate__(self, state):
+        # The tables and running totals are worked out again, pickles from before a table changed holding the old one
+        self.__dict__.update(state)
+        self._weights, self._scoring_lines = shared_table(('Board', self.size), self._tables)
+        self._scores = {}
+        self._positional = {}
+        self._rescore(self._weights.values())
+        self.__dict__.pop('zobrist', None)
+        self._zobrist_rows = shared_table(('Board zobrist', self.size), dict)
+        self._hash = None
+
+    def _tables(self):
+        """(x, y, score weight, positional weight) of each cell with either by (x, y), and those of each row and
+        column"""
+        scores = {(x, y): s for s, l in self.scoring_pos for x, y in l}
+        positional = positional_weights(self.size)
+        weights = {(x, y): (x, y, scores.get((x, y), 0), positional.get((x, y), 0))
+                   for x, y in {**scores, **positional}}
+        scoring_lines = {}
+        for i in range(self.size):
+            scoring_lines[('row', i)] = [rated for rated in weights.values() if rated[0] == i]
+            scoring_lines[('column', i)] = [rated for rated in weights.values() if rated[1] == i]
+        return weights, scoring_lines
 
     @property
     def cards(self):
@@ -78,6 +219,76 @@ class Board:
     @cards.setter
     def cards(self, cards):
         self._cards = [r[:] for r in cards]
+        self._scores = {}
+        self._positional = {}
+        self._rescore(self._weights.values())
+        self._hash = None
+
+    @property
+    def zobrist(self):
+        """Zobrist hash of the position"""
+        if self._hash is None:
+            self._hash = self._image_hash(range(self.size * self.size))
+        return self._hash
+
+    def _image_hash(self, cells):
+        """Zobrist hash of the position with the card on flat cell i moved to cells[i]"""
+        rows = self._zobrist_rows
+        out = 0
+        i = 0
+        for row in self._cards:
+            for card in row:
+                keys = rows.get((card.suit, card.name))
+                if keys is None:
+                    keys = rows[card.suit, card.name] = zobrist_row(self.size, card.suit, card.name)
+                out ^= keys[cells[i]]
+                i += 1
+        return out
+
+    def symmetric_hashes(self):
+        """Zobrist hash of the image of the position under each of self.symmetries"""
+        return [self.zobrist] + [self._image_hash(cells) for cells, _ in self.symmetries[1:]]
+
+    def canonical(self):
+        """(hash, symmetry): the least hash of the position's images and the index in self.symmetries of the one
+        with it, so positions that are images of each other share the hash"""
+        hashes = self.symmetric_hashes()
+        h = min(hashes)
+        return h, hashes.index(h)
+
+    def _rescore(self, cells):
+        """Adds the scores and positional terms of the cards on the given cells, as (x, y, score weight, positional
+        weight)"""
+        cards = self._cards
+        scores = self._scores
+        positional = self._positional
+        for x, y, weight, positional_weight in cells:
+            card = cards[x][y]
+            value = card.value
+            if value:
+                owner = card.player
+                scores[owner] = scores.get(owner, 0) + weight * value
+                positional[owner] = positional.get(owner, 0) + positional_weight * value
+
+    def _rescore_changed(self, cells, before):
+        """Moves the scores and positional terms on the given cells, as for _rescore, from the cards before held on
+        them to the cards on them now, skipping the cells whose card did not change"""
+        cards = self._cards
+        scores = self._scores
+        positional = self._positional
+        for (x, y, weight, positional_weight), old in zip(cells, before):
+            card = cards[x][y]
+            if card is not old:
+                value = old.value
+                if value:
+                    owner = old.player
+                    scores[owner] -= weight * value
+                    positional[owner] -= positional_weight * value
+                value = card.value
+                if value:
+                    owner = card.player
+                    scores[owner] = scores.get(owner, 0) + weight * value
+                    positional[owner] = positional.get(owner, 0) + positional_weight * value
 
     def finalise(self):
         self._final = 1
@@ -86,20 +297,39 @@ class Board:
         self._final = 0
 
     def get_empty(self):
-        if any(not blank.discarded for blank in self.blanks):
-            return [blank.pos for blank in self.blanks if not blank.discarded]
-        else:
-            return []
+        # A blank stays in self.blanks while covered by a test update, so the cell tells whether it is still empty
+        cards = self._cards
+        return [blank.pos for blank in self.blanks if cards[blank.pos[0] - 1][blank.pos[1] - 1] is blank]
 
     def score(self, player):
-        out = 0
-        if not self._final:
-            for s, l in self.scoring_pos:
-                for x, y in l:
-                    if self._cards[x][y].player == player:
-                        out += s * self._cards[x][y].value
-        else:
+        if self._final:
             raise Exception('Trying to score points on a finalised board for {}'.format(player))
+        out = self._scores.get(player, 0)
+        if DEBUG and out != self.full_score(player):
+            raise Exception('Running score {} for {} does not match board\n{}'.format(out, player, self))
+        return out
+
+    def positional(self, player):
+        """heuristic_eval's positional term for player, in 1/POSITIONAL_SCALE points"""
+        out = self._positional.get(player, 0)
+        if DEBUG and out != self.full_positional(player):
+            raise Exception('Running positional term {} for {} does not match board\n{}'.format(out, player, self))
+        return out
+
+    def full_positional(self, player):
+        out = 0
+        for (x, y), weight in positional_weights(self.size).items():
+            if self._cards[x][y].player == player:
+                out += weight * self._cards[x][y].value
+        return out
+
+    def full_score(self, player):
+        """Scores player by scanning every scoring position"""
+        out = 0
+        for s, l in self.scoring_pos:
+            for x, y in l:
+                if self._cards[x][y].player == player:
+                    out += s * self._cards[x][y].value
         return out
 
     def update(self, ply, test=False):
@@ -116,56 +346,70 @@ class Board:
                 error = 'Please choose from empty cells {}'.format(empty)
                 return discarded, error
             else:
+                rated = self._weights.get((ply.row - 1, ply.column - 1))
                 discarded, self._cards[ply.row - 1][ply.column - 1] = self._cards[ply.row - 1][ply.column - 1], card
+                if rated is not None:
+                    self._rescore_changed([rated], [discarded])
         else:
-            # Check insertion condition, determine if a row or column is being inserted to
-            if 0 < ply.row <= self.size and ply.column in (0, self.size + 1):
-                tempcards = self._cards
-                ins_row = True  # row or column?
-                ins_left = (ply.column == 0)  # left(top) or right(bottom)? (reverse if undoing)
-                ins_pos = ply.row  # row(col) index
-            elif 0 < ply.column <= self.size and ply.row in (0, self.size + 1):
-                # treat row and column insertion the same by transposing the card list for one of them
-                tempcards = list(map(list, zip(*self._cards)))
-                # column insertion
-                ins_row = False
-                ins_left = (ply.row == 0)
-                ins_pos = ply.column
-            else:
+            insertion = insertion_table(self.size).get((ply.row, ply.column))
+            if insertion is None:
                 discarded = ''
                 if PRINT:
                     print('Invalid row/column')
                 error = 'Invalid row/column'
                 return discarded, error
-
-            # treat left and right insertion the same by reversing in one case
-            if ins_left:
-                card_row = tempcards[ins_pos - 1]
+            (kind, index), pushed, gather = insertion
+            scoring = self._scoring_lines[kind, index]
+            before = [self._cards[x][y] for x, y, _, _ in scoring]
+            if kind == 'row':
+                cards = self._cards[index] + [card]
+                self._cards[index] = list(gather(cards))
             else:
-                card_row = tempcards[ins_pos - 1][::-1]
-
-            discarded = card_row[-1]
-            new_row = [card] + card_row[:-1]
-            # put the joker back in the right place if we're in that row/col
-            if ins_pos == self.joker_pos + 1:
-                new_row.insert(self.joker_pos, new_row.pop(self.joker_pos + 1))
-
-            # undo the row reverse and transpose
-            if not ins_left:
-                new_row.reverse()
-            if ins_row:
-                self._cards[ins_pos - 1] = new_row
-            else:
-                tempcards[ins_pos - 1] = new_row
-                self._cards = [x for x in map(list, zip(*tempcards))]
+                cards = [row[index] for row in self._cards] + [card]
+                for row, moved in zip(self._cards, gather(cards)):
+                    row[index] = moved
+            discarded = cards[pushed]
+            self._rescore_changed(scoring, before)
+        self._hash = None
 
-        discarded.discarded = 1  # Set card attribute
         if not test and isinstance(discarded, BlankCard):
             self.blanks.remove(discarded)
         return discarded, error
 
-    #    def is_setup_phase(self):
-    #        return (len(self.get_empty()) > 0)
+    def make_move(self, ply):
+        """Applies ply as a test update. Returns (token, error) where token holds the discarded card first and is
+        passed to unmake_move to restore only the cell, row or column that changed"""
+        empty = self.get_empty()
+        if empty:
+            r, c = ply.row - 1, ply.column - 1
+            saved = ('cell', (r, c), self._cards[r][c] if (ply.row, ply.column) in empty else None)
+        elif 0 < ply.row <= self.size and ply.column in (0, self.size + 1):
+            saved = ('row', ply.row - 1, self._cards[ply.row - 1])
+        elif 0 < ply.column <= self.size and ply.row in (0, self.size + 1):
+            saved = ('column', ply.column - 1, [row[ply.column - 1] for row in self._cards])
+        else:
+            saved = None
+        discarded, error = self.update(ply, test=True)
+        if error:
+            return None, error
+        return (discarded,) + saved, error
+
+    def unmake_move(self, token):
+        _, kind, index, saved = token
+        if kind == 'cell':
+            scoring = [self._weights[index]] if index in self._weights else []
+        else:
+            scoring = self._scoring_lines[kind, index]
+        before = [self._cards[x][y] for x, y, _, _ in scoring]
+        if kind == 'row':
+            self._cards[index] = saved
+        elif kind == 'column':
+            for row, card in zip(self._cards, saved):
+                row[index] = card
+        else:
+            self._cards[index[0]][index[1]] = saved
+        self._rescore_changed(scoring, before)
+        self._hash = None
 
     def __repr__(self):
         out = []
@@ -174,6 +418,381 @@ class Board:
         return '\n'.join(out)
         #  return '\n'.join(' '.join(str(card) for card in rows) for rows in self._cards) + '\n'
 
+    def card_at(self, row, column):
+        """Card instance at zero-indexed row, column"""
+        return self._cards[row][column]
+
+    def codes(self, players):
+        """Grid as a flat list of CompactBoard codes, numbering owners by their index in players"""
+        return [card_code(card, players) for row in self._cards for card in row]
+
+
+# Integer card codes for CompactBoard. Player cards follow BLANK, one block of 13 codes (indexed by RANKS) per owner
+FILLER, JOKER, BLANK = 0, 1, 2
+RANKS = ['K', 'Q', 'J', 'A', '2', '3', '4', '5', '6', '7', '8', '9', '0']
+RANK_INDEX = {name: i for i, name in enumerate(RANKS)}
+RANK_VALUES = [10, 10, 10, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10]
+# Ranks in hand order, highest value first, and the bit of each rank (by RANKS index) in Player.mask
+HAND_ORDER = sorted(range(len(RANKS)), key=lambda rank: -RANK_VALUES[rank])
+HAND_BIT = [HAND_ORDER.index(rank) for rank in range(len(RANKS))]
+
+
+def card_code(card, players):
+    if isinstance(card, Joker):
+        return JOKER
+    elif isinstance(card, BlankCard):
+        return BLANK
+    elif card.player is None:
+        return FILLER
+    return BLANK + 1 + players.index(card.player) * len(RANKS) + RANK_INDEX[card.name]
+
+
+def code_card(code, players):
+    """The Card of a player card code, the owner's own instance"""
+    slot, rank = divmod(code - BLANK - 1, len(RANKS))
+    return players[slot].cards[rank]
+
+
+class CompactBoard:
+    """Drop in replacement for Board storing the grid as a flat list of integer card codes, with the cells of every
+    insertion precomputed. Card instances are only kept to hand back discards and for printing."""
+    def __init__(self, size=5, empty='Default', players=None):
+        self._final = 0
+        self.size = size
+        self.joker = Joker()
+        self.joker_pos = size // 2
+        joker_cell = self.joker_pos * size + self.joker_pos
+        self._cells = [FILLER] * (size * size)
+        self._cells[joker_cell] = JOKER
+        if empty == 'Default':
+            empty = [(0, 0), (0, 1), (0, 3), (0, 4), (1, 0), (1, 4), (3, 0), (3, 4), (4, 0), (4, 1), (4, 3), (4, 4)]
+        self._blank_cells = []
+        self._blank_cards = {}
+        for x, y in empty:
+            i = x * size + y
+            self._cells[i] = BLANK
+            self._blank_cells.append(i)
+            self._blank_cards[i] = BlankCard((x + 1, y + 1))
+        self._n_blank = len(self._blank_cells)
+        self.scoring_pos = [(1, [(self.joker_pos - 1, self.joker_pos - 1), (self.joker_pos - 1, self.joker_pos + 1),
+                                 (self.joker_pos + 1, self.joker_pos - 1), (self.joker_pos + 1, self.joker_pos + 1)]),
+                            (2, [(self.joker_pos - 1, self.joker_pos), (self.joker_pos, self.joker_pos - 1),
+                                 (self.joker_pos + 1, self.joker_pos), (self.joker_pos, self.joker_pos + 1)])]
+        (self._scoring, self._weight, self._positional_weight, self._rated, self._lines, self._line_scoring,
+         self._insertions) = shared_table(('CompactBoard', size), self._tables)
+        # A running score and positional term per owner slot, kept up to date from the rated cells of each line
+        self._scores = []
+        self._positional = []
+
+        # Code tables, extended by a block of 13 codes as each owner is registered
+        self._slots = {}
+        self._value_of = [0, 0, 0]
+        self._card_of = [FILLER_CARD, self.joker, None]
+        # Zobrist keys indexed by code then cell, with the same keys as Board for the same position, and the hash
+        # worked out when asked for as on Board
+        self._zobrist = [zobrist_row(size, suit, name) for suit, name in (('*', '*'), ('', 'Jkr'), (' ', ' '))]
+        self._hash = None
+        if players is not None:
+            for player in players:
+                self.register(player)
+        self.symmetries = dihedral_maps(size)
+
+    def __setstate__(self, state):
+        # As Board's
+        self.__dict__.update(state)
+        (self._scoring, self._weight, self._positional_weight, self._rated, self._lines, self._line_scoring,
+         self._insertions) = shared_table(('CompactBoard', self.size), self._tables)
+        self._scores = [0] * len(self._slots)
+        self._positional = [0] * len(self._slots)
+        self._rescore(self._rated)
+        self.__dict__.pop('zobrist', None)
+        self._hash = None
+
+    def _tables(self):
+        """Scoring cells with their weights, the score and positional weights of every cell, the cells rated by
+        either, and the cells, rated cells and flat insertion_table entry of each edge insertion, its cells ordered
+        from the entry cell to the exit cell and skipping the joker. The flat entry is the slice of cells the line
+        takes and the gather on it"""
+        size = self.size
+        scoring = [(x * size + y, s) for s, l in self.scoring_pos for x, y in l]
+        weight = [0] * (size * size)
+        for i, s in scoring:
+            weight[i] = s
+        positional = [0] * (size * size)
+        for (x, y), w in positional_weights(size).items():
+            positional[x * size + y] = w
+        rated = [i for i in range(size * size) if weight[i] or positional[i]]
+        joker_cell = self.joker_pos * size + self.joker_pos
+        lines = {}
+        for i in range(1, size + 1):
+            row = [(i - 1) * size + c for c in range(size) if (i - 1) * size + c != joker_cell]
+            column = [r * size + i - 1 for r in range(size) if r * size + i - 1 != joker_cell]
+            lines[(i, 0)] = row
+            lines[(i, size + 1)] = row[::-1]
+            lines[(0, i)] = column
+            lines[(size + 1, i)] = column[::-1]
+        line_scoring = {key: [i for i in line if weight[i] or positional[i]] for key, line in lines.items()}
+        insertions = {}
+        for key, ((kind, index), _, gather) in insertion_table(size).items():
+            span = slice(index * size, (index + 1) * size) if kind == 'row' else slice(index, size * size, size)
+            insertions[key] = (span, gather)
+        return scoring, weight, positional, rated, lines, line_scoring, insertions
+
+    @classmethod
+    def from_codes(cls, size, codes, empty, players):
+        """Board holding codes (as from codes()) with owners numbered by their index in players. empty lists the
+        zero-indexed blank cells in get_empty order"""
+        board = cls(size, empty, players)
+        for code in codes:
+            if code > BLANK and board._card_of[code] is None:
+                board._card_of[code] = code_card(code, players)
+        board.cards = list(codes)
+        return board
+
+    def codes(self, players):
+        """Grid as a flat list of codes, numbering owners by their index in players"""
+        slots = {slot: players.index(player) for player, slot in self._slots.items()}
+        out = []
+        for code in self._cells:
+            if code > BLANK:
+                slot, rank = divmod(code - BLANK - 1, len(RANKS))
+                code = BLANK + 1 + slots[slot] * len(RANKS) + rank
+            out.append(code)
+        return out
+
+    def register(self, player):
+        """Assigns the next block of card codes to player and returns its slot"""
+        slot = self._slots.get(player)
+        if slot is None:
+            slot = self._slots[player] = len(self._slots)
+            self._scores.append(0)
+            self._positional.append(0)
+            self._value_of.extend(RANK_VALUES)
+            self._card_of.extend([None] * len(RANKS))
+            self._zobrist.extend(zobrist_row(self.size, player.suit, name) for name in RANKS)
+        return slot
+
+    def encode(self, card):
+        slot = self._slots.get(card.player)
+        if slot is None:
+            slot = self.register(card.player)
+        code = BLANK + 1 + slot * len(RANKS) + RANK_INDEX[card.name]
+        self._card_of[code] = card
+        return code
+
+    def decode(self, code, cell):
+        if code == BLANK:
+            return self._blank_cards[cell]
+        return self._card_of[code]
+
+    @property
+    def cards(self):
+        return self._cells[:]
+
+    @cards.setter
+    def cards(self, cells):
+        self._cells = cells[:]
+        self._n_blank = sum(1 for i in self._blank_cells if self._cells[i] == BLANK)
+        self._scores = [0] * len(self._slots)
+        self._positional = [0] * len(self._slots)
+        self._rescore(self._rated)
+        self._hash = None
+
+    @property
+    def zobrist(self):
+        """Same as Board.zobrist"""
+        if self._hash is None:
+            zobrist = self._zobrist
+            h = 0
+            for i, code in enumerate(self._cells):
+                h ^= zobrist[code][i]
+            self._hash = h
+        return self._hash
+
+    def symmetric_hashes(self):
+        """Same as Board.symmetric_hashes"""
+        zobrist = self._zobrist
+        out = [self.zobrist]
+        for cells, _ in self.symmetries[1:]:
+            h = 0
+            for code, i in zip(self._cells, cells):
+                h ^= zobrist[code][i]
+            out.append(h)
+        return out
+
+    def canonical(self):
+        """Same as Board.canonical"""
+        hashes = self.symmetric_hashes()
+        h = min(hashes)
+        return h, hashes.index(h)
+
+    def _rescore(self, cells):
+        for i in cells:
+            code = self._cells[i]
+            if code > BLANK:
+                slot = (code - BLANK - 1) // len(RANKS)
+                value = self._value_of[code]
+                self._scores[slot] += self._weight[i] * value
+                self._positional[slot] += self._positional_weight[i] * value
+
+    def _rescore_changed(self, cells, before):
+        """Same as Board._rescore_changed, before holding codes"""
+        codes = self._cells
+        value_of = self._value_of
+        weight = self._weight
+        positional_weight = self._positional_weight
+        scores = self._scores
+        positional = self._positional
+        for i, old in zip(cells, before):
+            code = codes[i]
+            if code != old:
+                if old > BLANK:
+                    slot = (old - BLANK - 1) // len(RANKS)
+                    value = value_of[old]
+                    scores[slot] -= weight[i] * value
+                    positional[slot] -= positional_weight[i] * value
+                if code > BLANK:
+                    slot = (code - BLANK - 1) // len(RANKS)
+                    value = value_of[code]
+                    scores[slot] += weight[i] * value
+                    positional[slot] += positional_weight[i] * value
+
+    def finalise(self):
+        self._final = 1
+
+    def unfinalise(self):
+        self._final = 0
+
+    def get_empty(self):
+        if self._n_blank:
+            return [self._blank_cards[i].pos for i in self._blank_cells if self._cells[i] == BLANK]
+        else:
+            return []
+
+    def score(self, player):
+        if self._final:
+            raise Exception('Trying to score points on a finalised board for {}'.format(player))
+        slot = self._slots.get(player)
+        if slot is None:
+            return 0
+        out = self._scores[slot]
+        if DEBUG and out != self.full_score(player):
+            raise Exception('Running score {} for {} does not match board\n{}'.format(out, player, self))
+        return out
+
+    def positional(self, player):
+        """Same as Board.positional"""
+        slot = self._slots.get(player)
+        if slot is None:
+            return 0
+        out = self._positional[slot]
+        if DEBUG and out != self.full_positional(player):
+            raise Exception('Running positional term {} for {} does not match board\n{}'.format(out, player, self))
+        return out
+
+    def full_positional(self, player):
+        out = 0
+        for (x, y), weight in positional_weights(self.size).items():
+            card = self.card_at(x, y)
+            if card.player == player:
+                out += weight * card.value
+        return out
+
+    def full_score(self, player):
+        slot = self._slots.get(player)
+        if slot is None:
+            return 0
+        lo = BLANK + 1 + slot * len(RANKS)
+        hi = lo + len(RANKS)
+        out = 0
+        for i, s in self._scoring:
+            code = self._cells[i]
+            if lo <= code < hi:
+                out += s * self._value_of[code]
+        return out
+
+    def update(self, ply, test=False):
+        """Same interface as Board.update"""
+        card = ply.card
+        error = ''
+        cells = self._cells
+        if self._n_blank:
+            empty = self.get_empty()
+            if (ply.row, ply.column) not in empty:
+                if PRINT:
+                    print('Please choose from empty cells', empty)
+                discarded = ''
+                error = 'Please choose from empty cells {}'.format(empty)
+                return discarded, error
+            i = (ply.row - 1) * self.size + ply.column - 1
+            discarded = self._blank_cards[i]
+            cells[i] = self.encode(card)
+            self._n_blank -= 1
+            if self._weight[i] or self._positional_weight[i]:
+                self._rescore([i])
+        else:
+            line = self._lines.get((ply.row, ply.column))
+            if line is None:
+                discarded = ''
+                if PRINT:
+                    print('Invalid row/column')
+                error = 'Invalid row/column'
+                return discarded, error
+            scoring = self._line_scoring[ply.row, ply.column]
+            before = [cells[i] for i in scoring]
+            discarded = self.decode(cells[line[-1]], line[-1])
+            span, gather = self._insertions[ply.row, ply.column]
+            moved = cells[span]
+            moved.append(self.encode(card))
+            cells[span] = gather(moved)
+            self._rescore_changed(scoring, before)
+        self._hash = None
+        return discarded, error
+
+    def make_move(self, ply):
+        """Same interface as Board.make_move"""
+        if self._n_blank:
+            i = (ply.row - 1) * self.size + ply.column - 1
+            saved = ('cell', i, BLANK)
+        else:
+            key = (ply.row, ply.column)
+            saved = ('line', key, [self._cells[i] for i in self._lines.get(key, ())])
+        discarded, error = self.update(ply, test=True)
+        if error:
+            return None, error
+        return (discarded,) + saved, error
+
+    def unmake_move(self, token):
+        _, kind, index, saved = token
+        if kind == 'line':
+            scoring = self._line_scoring[index]
+            line = self._lines[index]
+            cells = self._cells
+            before = [cells[i] for i in scoring]
+            for i, code in zip(line, saved):
+                cells[i] = code
+            self._rescore_changed(scoring, before)
+        else:
+            before = self._cells[index]
+            self._cells[index] = saved
+            if self._weight[index] or self._positional_weight[index]:
+                self._rescore_changed([index], [before])
+            self._n_blank += 1
+        self._hash = None
+
+    def card_at(self, row, column):
+        cell = row * self.size + column
+        code = self._cells[cell]
+        if code == BLANK:
+            return self._blank_cards[cell]
+        return self._card_of[code]
+
+    def __repr__(self):
+        out = []
+        for r in range(self.size):
+            out.append(' | '.join(str(self.card_at(r, c)) for c in range(self.size)))
+        return '\n'.join(out)
+
 
 # The information a player gives to the game to make a ply (move)
 class Ply:
@@ -193,38 +812,73 @@ class Player:
         self.score = 0
         self.name = name
         self.suit = suit
-        # noinspection PyTypeChecker
-        l = ['K', 'Q', 'J', 'A'] + list(range(2, 11))
-        self.hand = sorted((Card(i, suit, self) for i in l), key=lambda x: -x.value)
+        # Every card of the player by RANKS index, in hand or not
+        self.cards = [Card(name if name != '0' else '10', suit, self) for name in RANKS]
+        # The hand is the cards with their HAND_BIT set in mask. self.hand lists them in hand order, highest first
+        self.mask = (1 << len(RANKS)) - 1
+        self.hand = [self.cards[rank] for rank in HAND_ORDER]
         self.AI = False
+        # Cards a search considers: 1 the highest, 2 the highest or the lowest, 3 or more any, one of each value
         self.card_options = card_options
+        self._hand_keys = [zobrist_key(-1, suit, name) for name in RANKS]
+        self.hand_hash = 0  # Zobrist hash of the cards in hand
+        for key in self._hand_keys:
+            self.hand_hash ^= key
+
+    def __setstate__(self, state):
+        # Pickles from before the mask only hold the hand
+        self.__dict__.update(state)
+        if 'mask' not in state:
+            cards = {card.name: card for card in self.hand}
+            self.cards = [cards.get(name) or Card(name if name != '0' else '10', self.suit, self) for name in RANKS]
+            for card in self.cards:
+                card.played = card.name not in cards
+            self.mask = sum(1 << HAND_BIT[RANK_INDEX[name]] for name in cards)
+            self._hand_keys = [zobrist_key(-1, self.suit, name) for name in RANKS]
+            self.hand_hash = 0
+            for name in cards:
+                self.hand_hash ^= zobrist_key(-1, self.suit, name)
 
     def in_hand(self, card):
         """Tests if a card (by instance or name) is in player's hand and returns instance or False"""
-        for c in self.hand:
-            if c.name == card or c == card:
-                return c
+        if isinstance(card, Card):
+            rank = RANK_INDEX.get(card.name)
+            if rank is None or self.cards[rank] is not card:
+                return False
+        else:
+            rank = RANK_INDEX.get(card)
+            if rank is None:
+                return False
+        if self.mask >> HAND_BIT[rank] & 1:
+            return self.cards[rank]
         return False
-        # return any(c.name == card for c in self.hand) or card in self.hand
 
     def play(self, card):
         """Tells a player to remove a card from their hand"""
-        if not self.in_hand(card):
+        c = self.in_hand(card)
+        if not c:
             raise Exception('Card {} not in hand'.format(card))
-        for i, c in enumerate(self.hand):
-            if c.name == card or c == card:  # Either by name or card instance
-                c.played = True
-                del self.hand[i]
-                return True
-        raise Exception('Card not removed')
-
-    # def unplay(self, card):
-    #     if self.in_hand(card):
-    #         raise Exception('Card {} already in hand during tree backtrack'.format(card))
-    #     if card != '':
-    #         card.played = False
-    #     self.hand.append(card)
-    #     return True
+        rank = RANK_INDEX[c.name]
+        bit = HAND_BIT[rank]
+        # Its place in the hand is the number of cards in hand before it
+        del self.hand[(self.mask & ((1 << bit) - 1)).bit_count()]
+        self.mask ^= 1 << bit
+        c.played = True
+        self.hand_hash ^= self._hand_keys[rank]
+        return True
+
+    def unplay(self, card):
+        """Returns a played card to the player's hand in its sorted place"""
+        rank = RANK_INDEX[card.name]
+        bit = HAND_BIT[rank]
+        if self.mask >> bit & 1:
+            raise Exception('Card {} already in hand during tree backtrack'.format(card))
+        card.played = False
+        self.cards[rank] = card
+        self.hand.insert((self.mask & ((1 << bit) - 1)).bit_count(), card)
+        self.mask |= 1 << bit
+        self.hand_hash ^= self._hand_keys[rank]
+        return True
 
     def alter_score(self, delta):
         if delta > 500:
@@ -248,13 +902,22 @@ class Player:
                              [(bsize + 1, i) for i in range(1, bsize + 1)] + \
                              [(i, 0) for i in range(1, bsize + 1)] + \
                              [(i, bsize + 1) for i in range(1, bsize + 1)]
+            if player.card_options > 2:
+                twins = corner_twins(game.board)
+                if twins:
+                    rowcol_options = [rowcol for rowcol in rowcol_options if rowcol not in twins]
 
-        # choose either the highest or lowest value card
+        # choose either the highest or lowest value card, or one of each value
         if len(player.hand) > 1 and player.card_options > 1:
             if player.card_options == 2:
                 card_choices = [player.hand[0], player.hand[-1]]
             else:
-                raise NotImplementedError
+                # Cards of equal value, as J, Q and K, leave the same position but for their names. The hand is in
+                # value order, so the first of each value is kept
+                card_choices = [player.hand[0]]
+                for card in player.hand:
+                    if card.value != card_choices[-1].value:
+                        card_choices.append(card)
         else:
             # Pick maximum
             card_choices = [player.hand[0]]
@@ -267,6 +930,11 @@ class Player:
     def make_move(self, game_state):
         raise NotImplementedError
 
+    def timed_move(self, game_state, time_budget, verbose=None):
+        """make_move for a caller that needs a reply within time_budget seconds. Only players that search use it, and
+        only AITreeSearch prints, unless verbose is False (None follows PRINT)"""
+        return self.make_move(game_state)
+
     def __repr__(self):
         if self.AI:
             return 'AI - {} ({})'.format(self.name, self.suit)
@@ -300,9 +968,15 @@ class HumanPlayer(Player):
 
 
 class AIPlayer(Player):
-    def __init__(self, name, suit):
+    def __init__(self, name, suit, gm='r'):
         super().__init__(name, suit)
         self.AI = True
+        self.gm = gm  # As curling.random_ai_turn: "r1" and "r2" keep to the rows/columns 1-3 and 2-4
+
+    def __setstate__(self, state):
+        # Pickles from before gm play anywhere
+        super().__setstate__(state)
+        self.__dict__.setdefault('gm', 'r')
 
     def make_move(self, game_state):
         """Selects max card and random valid row/column"""
@@ -311,69 +985,582 @@ class AIPlayer(Player):
         else:
             raise Exception("Empty Hand")
         # print(card)
-        empty = game_state.board.get_empty()
+        board = game_state.board
+        empty = board.get_empty()
+        min_choice = 2 if self.gm == "r2" else 1
+        if self.gm == "r1":
+            max_choice = 3
+        elif self.gm == "r2":
+            max_choice = 4
+        else:
+            max_choice = board.size
         # print(empty)
         if empty:
             row, column = random.choice(empty)
+            if self.gm in ("r1", "r2"):
+                e1 = [(r, c) for (r, c) in empty if min_choice <= r <= max_choice and min_choice <= c <= max_choice]
+                if e1:
+                    row, column = random.choice(e1)
+                else:
+                    ec = [(r, c) for (r, c) in empty if min_choice <= c <= max_choice]
+                    er = [(r, c) for (r, c) in empty if min_choice <= r <= max_choice]
+                    insert = random.choice(('R', 'C'))
+                    if er and (insert == 'R' or not ec):
+                        row, column = random.choice(er)
+                    elif ec:
+                        row, column = random.choice(ec)
         else:
             insert = random.choice(('R', 'C'))
             if insert == "R":
-                row = random.choice((0, game_state.board.size + 1))
-                column = random.randint(1, 5)
+                row = random.choice((0, board.size + 1))
+                column = random.randint(min_choice, max_choice)
             else:
-                column = random.choice((0, game_state.board.size + 1))
-                row = random.randint(1, 5)
+                column = random.choice((0, board.size + 1))
+                row = random.randint(min_choice, max_choice)
+        return Ply(card, row, column)
+
+
+class AIGreedyPlayer(Player):
+    def __init__(self, name, suit):
+        super().__init__(name, suit)
+        self.AI = True
+
+    def make_move(self, game_state):
+        """As curling.one_set_ai: max card wherever it most raises our board score over the others'"""
+        if not self.hand:
+            raise Exception("Empty Hand")
+        card = self.hand[0]
+        board = game_state.board
+        empty = board.get_empty()
+        if empty:
+            choices = empty
+        else:
+            choices = [(0, i + 1) for i in range(board.size)] + [(board.size + 1, i + 1) for i in range(board.size)] + \
+                      [(i + 1, 0) for i in range(board.size)] + [(i + 1, board.size + 1) for i in range(board.size)]
+        import batch
+        if batch.AVAILABLE:
+            seat = game_state.players.index(self)
+            scored = batch.greedy_scores(board.codes(game_state.players), board.size,
+                                         [(batch.player_code(card, seat), r, c) for r, c in choices],
+                                         len(game_state.players), seat)
+        else:
+            scored = []
+            for r, c in choices:
+                token, error = board.make_move(Ply(card, r, c))
+                scored.append(2 * board.score(self) - sum(board.score(p) for p in game_state.players))
+                board.unmake_move(token)
+        best = [choices[0]]
+        best_score = 0
+        for (r, c), score in zip(choices, scored):
+            if score > best_score:
+                best = [(r, c)]
+                best_score = score
+            elif score == best_score:
+                best.append((r, c))
+        row, column = random.choice(best)
         return Ply(card, row, column)
 
 
+# Search modes for AITreeSearch: plain max^n, paranoid alpha-beta, max^n with shallow pruning and best-reply search.
+# Shallow pruning only skips plies that cannot change max^n's choice, so it plays as max^n does. Paranoid (everyone
+# else plays against the mover) and best-reply (only the strongest reply of any opponent is searched) value positions
+# differently, and so often pick another ply: on compare_search_modes' defaults one max^n rates best 60% and 40% of
+# the time
+SEARCH_MODES = ('maxn', 'paranoid', 'shallow', 'brs')
+EPS = 1e-9  # Root window margin so pruned searches still find every tied best ply
+# heuristic_eval gives any two players a value sum of at most 0 before the game ends (each is their points minus
+# everyone else's) and at most 9000 once it has (a sole winner and a loser). This bounds max^n for shallow pruning
+WIN_PAIR_BOUND = 9000
+# order_plies only works out each ply's one-ply score gain with at least this many plies left below it, where the
+# subtrees it orders cost more than the look
+ORDERING_GAIN_DEPTH = 2
+
+
+# Kinds of transposition table value: exact, or a lower or upper bound from an alpha-beta cutoff
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+_pools = {}
+
+
+def process_pool(workers):
+    """Process pool shared by every parallel search using this many workers"""
+    pool = _pools.get(workers)
+    if pool is None:
+        pool = _pools[workers] = ProcessPoolExecutor(workers)
+    return pool
+
+
+@atexit.register
+def shutdown_pools():
+    """Shuts down the process pools, cancelling the searches not yet started"""
+    for pool in _pools.values():
+        pool.shutdown(cancel_futures=True)
+    _pools.clear()
+
+
+def search_root_plies(snapshot, plies, depth, options, deadline):
+    """Worker side of AITreeSearch.parallel_search. Rebuilds the game from snapshot and scores the root plies,
+    given as (card name, row, column), returning their values and the number of nodes searched. options are the
+    parent's AITreeSearch.worker_options"""
+    global PRINT
+    PRINT = False
+    game = Game.from_snapshot(snapshot)
+    player = game.players[game.p_turn]
+    searcher = AITreeSearch('worker', '', depth, **options)
+    searcher.deadline = deadline
+    plies = [Ply(player.in_hand(name), row, column) for name, row, column in plies]
+    alter_scores = {p: 0 for p in game.players}
+    values = [value for _, value in searcher.score_plies(game, depth, game.p_turn, alter_scores, plies)]
+    return values, searcher.nodes
+
+
+class SearchStats:
+    """What a search spent its time on. AITreeSearch(stats=True) fills one per make_move and adds them up per game.
+    Nodes are counted by ply below the root, so nodes_by_ply[0] counts the root's children and nodes_by_ply[0] /
+    moves is the branching at the root"""
+    def __init__(self):
+        self.moves = 0
+        self.nodes = 0
+        self.nodes_by_ply = []
+        self.trees = []  # (nodes, plies) of each make_move's search
+        self.leaves = 0
+        self.searched = 0  # Nodes whose plies a pruned mode searched, the nodes that could have had a cutoff
+        self.cutoffs = 0
+        self.first_cutoffs = 0  # Cutoffs by the first ply tried, the mark of good move ordering
+        self.table_probes = 0
+        self.table_hits = 0
+        self.time = 0
+        self.time_by_depth = {}  # Per iterative deepening depth, or the fixed depth
+        self.time_by_function = {}
+
+    def instrument(self, searcher, game):
+        """Times and counts the search's calls by shadowing the methods on the instances"""
+        def timed(name, f, count=None):
+            def wrapper(*args):
+                if count is not None:
+                    count()
+                t = time.perf_counter()
+                try:
+                    return f(*args)
+                finally:
+                    self.time_by_function[name] = self.time_by_function.get(name, 0) + time.perf_counter() - t
+            return wrapper
+
+        def count_node():
+            ply = len(game.tested)
+            while len(self.nodes_by_ply) <= ply:
+                self.nodes_by_ply.append(0)
+            self.nodes_by_ply[ply] += 1
+            self.nodes += 1
+
+        def count_leaf():
+            self.leaves += 1
+
+        game.test_move = timed('test_move', game.test_move, count_node)
+        game.untest_move = timed('untest_move', game.untest_move)
+        searcher.heuristic_eval = timed('heuristic_eval', searcher.heuristic_eval, count_leaf)
+
+    @staticmethod
+    def uninstrument(searcher, game):
+        for obj, name in ((game, 'test_move'), (game, 'untest_move'), (searcher, 'heuristic_eval')):
+            obj.__dict__.pop(name, None)
+
+    def add(self, other):
+        self.moves += other.moves
+        self.nodes += other.nodes
+        self.trees.extend(other.trees)
+        for ply, n in enumerate(other.nodes_by_ply):
+            if ply == len(self.nodes_by_ply):
+                self.nodes_by_ply.append(0)
+            self.nodes_by_ply[ply] += n
+        self.leaves += other.leaves
+        self.searched += other.searched
+        self.cutoffs += other.cutoffs
+        self.first_cutoffs += other.first_cutoffs
+        self.table_probes += other.table_probes
+        self.table_hits += other.table_hits
+        self.time += other.time
+        for totals, times in ((self.time_by_depth, other.time_by_depth),
+                              (self.time_by_function, other.time_by_function)):
+            for k, t in times.items():
+                totals[k] = totals.get(k, 0) + t
+
+    def branching(self):
+        """Mean children per node at each ply from the root, the root first"""
+        nodes = [self.moves] + self.nodes_by_ply
+        return [b / a for a, b in zip(nodes, nodes[1:]) if a]
+
+    def effective_branching(self):
+        """Mean over the searched moves of the branching factor b of a uniform tree with as many nodes over as many
+        plies, b + b^2 + ... + b^plies = nodes"""
+        out = [uniform_branching(nodes, plies) for nodes, plies in self.trees if nodes and plies]
+        return sum(out) / len(out) if out else 0
+
+    def summary(self):
+        lines = ['{} moves, {} nodes, {} leaves, {} cutoffs, {:.3f}s'.format(self.moves, self.nodes, self.leaves,
+                                                                          self.cutoffs, self.time),
+                 'Nodes by ply: {}'.format(self.nodes_by_ply),
+                 'Branching: {} (effective {:.2f})'.format(['{:.2f}'.format(b) for b in self.branching()],
+                                                           self.effective_branching())]
+        if self.searched:
+            lines.append('Cutoffs: {} of {} nodes searched ({:.1%}), {:.1%} of them by the first ply'.format(
+                self.cutoffs, self.searched, self.cutoffs / self.searched,
+                self.first_cutoffs / self.cutoffs if self.cutoffs else 0))
+        if self.table_probes:
+            lines.append('Table hits: {} of {} ({:.1%})'.format(self.table_hits, self.table_probes,
+                                                               self.table_hits / self.table_probes))
+        lines.append('Time by depth: {}'.format(', '.join('{}: {:.3f}s'.format(k, t)
+                                                          for k, t in sorted(self.time_by_depth.items()))))
+        lines.append('Time by function: {}'.format(', '.join('{}: {:.3f}s'.format(k, t)
+                                                             for k, t in self.time_by_function.items())))
+        return '\n'.join(lines)
+
+
+def uniform_branching(nodes, plies):
+    """b with b + b^2 + ... + b^plies = nodes, by bisection"""
+    lo, hi = 0, max(nodes, 1)
+    for _ in range(100):
+        b = (lo + hi) / 2
+        if sum(b ** k for k in range(1, plies + 1)) < nodes:
+            lo = b
+        else:
+            hi = b
+    return (lo + hi) / 2
+
+
+class SearchTimeout(Exception):
+    """Raised inside a search once its deadline has passed"""
+
+
+class TranspositionTable:
+    """Bounded store of search results. Each key hashes to a single slot, and a new result replaces what is there
+    unless that came from a deeper search during the current make_move"""
+    def __init__(self, size=2 ** 16):
+        self.size = size
+        self._slots = [None] * size
+        self.generation = 0
+        self.probes = 0
+        self.hits = 0
+        self.stores = 0
+        self.replaced = 0
+
+    def new_search(self):
+        self.generation += 1
+
+    def probe(self, key, depth):
+        """Returns (values, ply, flag) stored for key by a search at least depth deep, or None"""
+        self.probes += 1
+        entry = self._slots[hash(key) % self.size]
+        if entry is not None and entry[0] == key and entry[1] >= depth:
+            self.hits += 1
+            return entry[3:]
+        return None
+
+    def best_ply(self, key):
+        """The ply stored for key by a search of any depth, or None. Not counted as a probe"""
+        entry = self._slots[hash(key) % self.size]
+        if entry is not None and entry[0] == key:
+            return entry[4]
+        return None
+
+    def store(self, key, depth, values, ply, flag=EXACT):
+        i = hash(key) % self.size
+        entry = self._slots[i]
+        if entry is None or entry[2] != self.generation or depth >= entry[1]:
+            if entry is not None and entry[0] != key:
+                self.replaced += 1
+            self._slots[i] = (key, depth, self.generation, values, ply, flag)
+            self.stores += 1
+
+    def clear(self):
+        self._slots = [None] * self.size
+
+    def hit_rate(self):
+        return self.hits / self.probes if self.probes else 0
+
+    def report(self):
+        filled = sum(1 for entry in self._slots if entry is not None)
+        return {'size': self.size, 'filled': filled, 'probes': self.probes, 'hits': self.hits,
+                'hit_rate': self.hit_rate(), 'stores': self.stores, 'replaced': self.replaced}
+
+
 class AITreeSearch(Player):
-    def __init__(self, name, suit, depth=2, card_options=1):
+    def __init__(self, name, suit, depth=2, card_options=1, mode='maxn', table_size=2 ** 16, time_budget=None,
+                 workers=None, stats=False, endgame_plies=4, symmetry=True, book=False, ordering=True, batch=True):
         super().__init__(name, suit, card_options)
         self.AI = True
         self.depth = depth  # tree search depth (plies)
         self.t_game = []  # to hold the local version of the game
-
-    def make_move(self, game_state):
-        """Runs a tree search to find out best move"""
+        if mode not in SEARCH_MODES:
+            raise Exception('Unknown search mode {}, choose from {}'.format(mode, SEARCH_MODES))
+        self.mode = mode
+        self.nodes = 0  # positions generated by the last make_move
+        # Kept for the whole game, so later moves reuse earlier searches. table_size=0 turns it off
+        self.table = TranspositionTable(table_size) if table_size else None
+        # With a time budget (seconds) make_move deepens one ply at a time until it runs out, ignoring depth
+        self.time_budget = time_budget
+        self.deadline = None
+        self.completed_depth = None  # deepest search finished by the last make_move
+        # With workers the root plies are split over that many processes
+        self.workers = workers
+        # With stats, self.stats describes the last make_move and self.game_stats every one so far. Counts from
+        # parallel workers only reach nodes
+        self.stats = None
+        self.game_stats = SearchStats() if stats else None
+        # With endgame_plies or fewer plies left the game is solved exactly instead, by an EndgameSolver kept for the
+        # whole game. 0 turns it off
+        self.endgame_plies = endgame_plies
+        self.endgame = None
+        # With symmetry the table keys positions by Board.canonical, so a position and its mirror images share an
+        # entry, and root plies a symmetry of the position takes onto each other are only searched once
+        self.symmetry = symmetry
+        # With book, setup plies in the opening book (openings.py) are played from it without a search. The book holds
+        # highest card plies, so it is only used with card_options 1
+        self.book = book
+        # With ordering the pruned modes search the plies likeliest to be best or cause a cutoff first (see
+        # order_plies). Plain max^n prunes nothing, so its order is left alone. Both tables start afresh each move
+        self.ordering = ordering
+        self.killers = {}  # plies from the root: the last two plies to cause a cutoff there, as (card, row, column)
+        self.history = {}  # (seat, card, row, column): credit for the cutoffs the ply has caused, more for deeper ones
+        # With batch and NumPy installed, max^n and the root score the children of a node with no plies left below
+        # all at once (batch.child_values) instead of playing each. Not while stats are kept, which count the plies
+        self.batch = batch
+
+    def __setstate__(self, state):
+        # Pickles from before an option was added take its default, as a new searcher has it
+        super().__setstate__(state)
+        for name, value in AITreeSearch(self.name, self.suit, card_options=self.card_options).__dict__.items():
+            self.__dict__.setdefault(name, value)
+
+    def make_move(self, game_state, verbose=None):
+        """Runs a tree search to find out best move, printing its progress if verbose (None follows PRINT)"""
         # entry point
-        global PRINT
-        PRINT = False
-        print("Enter AITree make_move")
+        if verbose is None:
+            verbose = PRINT
+        if verbose:
+            print("Enter AITree make_move")
         # create local version of the game without letting it enter its game loop
         self.t_game = Game(game_state, autostart=False)  # copy.deepcopy(Game(game_state, autostart = False))
 
         # do a tree search recursively to find the best ply and its expected scores
         alter_scores = {player: 0 for player in self.t_game.players}
-        bestscores, bestply = self.tree_search(self.t_game, self.depth, self.t_game.p_turn, alter_scores)
+        self.nodes = 0
+        if self.book:
+            bookply = self.book_ply(self.t_game)
+            if bookply is not None:
+                if verbose:
+                    print("Exit AITree make_move, opening book ply: ", bookply)
+                return bookply
+        if self.table is not None:
+            self.table.new_search()
+        self.killers = {}
+        self.history = {}
+        if self.game_stats is not None:
+            self.stats = SearchStats()
+            self.stats.instrument(self, self.t_game)
+            t = time.perf_counter()
+            table_counts = (self.table.probes, self.table.hits) if self.table is not None else (0, 0)
+        try:
+            if self.time_budget is None:
+                bestscores, bestply = self.timed_search(self.t_game, self.depth, self.t_game.p_turn, alter_scores)
+                self.completed_depth = self.depth
+            else:
+                bestscores, bestply = self.iterative_search(self.t_game, self.t_game.p_turn, alter_scores)
+        finally:
+            if self.game_stats is not None:
+                self.stats.uninstrument(self, self.t_game)
+                self.stats.moves = 1
+                self.stats.time = time.perf_counter() - t
+                if self.table is not None:
+                    self.stats.table_probes = self.table.probes - table_counts[0]
+                    self.stats.table_hits = self.table.hits - table_counts[1]
+                if self.workers:
+                    self.stats.nodes = self.nodes
+                # The workers' nodes are not counted by ply, and a search to depth d goes d + 1 plies down
+                plies = len(self.stats.nodes_by_ply) or (self.completed_depth or 0) + 1
+                self.stats.trees = [(self.stats.nodes, plies)]
+                self.game_stats.add(self.stats)
 
         # point the resulting card object to the actual card in the real game
         for card in self.hand:
             if card.name == bestply.card.name:
                 bestply.card = card
-        print("Exit AITree make_move, best scores: ", bestscores)
-        PRINT = True
+        if verbose:
+            print("Exit AITree make_move, best scores: ", bestscores, "depth:", self.completed_depth)
         return bestply
 
+    def book_ply(self, game):
+        """Ply of a card in this player's hand from the opening book, or None out of the book"""
+        if self.card_options != 1:
+            return None
+        import openings
+        found = openings.game_ply(game, game.p_turn)
+        if found is None:
+            return None
+        rank, row, column = found
+        card = self.in_hand(RANKS[rank])
+        return Ply(card, row, column) if card else None
+
+    def timed_move(self, game_state, time_budget, verbose=None):
+        own_budget = self.time_budget
+        if own_budget is None or time_budget < own_budget:
+            self.time_budget = time_budget
+        try:
+            return self.make_move(game_state, verbose)
+        finally:
+            self.time_budget = own_budget
+
+    def iterative_search(self, game, p_turn, alter_scores):
+        """Searches depth 0, 1, 2... until the time budget runs out, returning the deepest finished search. Depth 0
+        always finishes so there is a ply to return. In the endgame the exact solver goes first, within the budget,
+        and the depths are only searched if it runs out"""
+        start = time.time()
+        if self.in_endgame(game):
+            self.deadline = start + self.time_budget
+            try:
+                result = self.solve_endgame(game, p_turn, alter_scores)
+                self.completed_depth = sum(len(p.hand) for p in game.players)
+                return result
+            except SearchTimeout:
+                pass
+        self.deadline = None
+        result = self.timed_search(game, 0, p_turn, alter_scores, False)
+        self.completed_depth = 0
+        self.deadline = start + self.time_budget
+        try:
+            for depth in range(1, sum(len(p.hand) for p in game.players)):
+                t = time.time()
+                result = self.timed_search(game, depth, p_turn, alter_scores, False)
+                self.completed_depth = depth
+                # The next depth will take at least as long as this one did
+                if 2 * time.time() - t > self.deadline:
+                    break
+        except SearchTimeout:
+            game.untest_all()
+        finally:
+            self.deadline = None
+        return result
+
+    def timed_search(self, game, depth, p_turn, alter_scores, endgame=True):
+        """search, adding its time to the stats for depth"""
+        if self.stats is None:
+            return self.search(game, depth, p_turn, alter_scores, endgame)
+        t = time.perf_counter()
+        try:
+            return self.search(game, depth, p_turn, alter_scores, endgame)
+        finally:
+            self.stats.time_by_depth[depth] = self.stats.time_by_depth.get(depth, 0) + time.perf_counter() - t
+
+    def check_time(self):
+        # Only look at the clock every 256 nodes
+        if self.deadline is not None and not self.nodes % 256 and time.time() > self.deadline:
+            raise SearchTimeout
+
+    def search(self, game, depth, p_turn, alter_scores, endgame=True):
+        """Searches from the root in this player's mode, returning (values, best ply). The pruned and parallel
+        searches return the mover's value alone. With endgame, the endgame is solved exactly instead"""
+        if endgame and self.in_endgame(game):
+            return self.solve_endgame(game, p_turn, alter_scores)
+        if self.workers:
+            return self.parallel_search(game, depth, p_turn, alter_scores)
+        if self.mode == 'maxn':
+            return self.tree_search(game, depth, p_turn, alter_scores, self.root_plies(game, p_turn))
+        return self.root_search(game, depth, p_turn, alter_scores)
+
+    def root_plies(self, game, p_turn):
+        """The mover's plies, less those a symmetry of the position takes onto an earlier one"""
+        plies = list(game.players[p_turn].enum_plies(game, p_turn))
+        if not self.symmetry or not game.board.get_empty():
+            return plies
+        hashes = game.board.symmetric_hashes()
+        # The symmetries leaving the position as it is
+        stabiliser = [game.board.symmetries[t][1] for t in range(1, len(hashes)) if hashes[t] == hashes[0]]
+        if not stabiliser:
+            return plies
+        seen = set()
+        out = []
+        for ply in plies:
+            if (ply.card.name, ply.row, ply.column) not in seen:
+                out.append(ply)
+                seen.update((ply.card.name,) + plies_map[ply.row, ply.column] for plies_map in stabiliser)
+        return out
+
+    def in_endgame(self, game):
+        return self.endgame_plies and sum(len(p.hand) for p in game.players) <= self.endgame_plies
+
+    def solve_endgame(self, game, p_turn, alter_scores):
+        """Exact search to the end of the game, returning heuristic_eval's values of the final position it leads to
+        and a best ply. Raises SearchTimeout if it passes the deadline"""
+        import endgame
+        import playout
+        if self.endgame is None:
+            self.endgame = endgame.EndgameSolver()
+        state = playout.PlayoutState.from_game(game, p_turn, alter_scores)
+        nodes = self.endgame.nodes
+        try:
+            scores, moves = self.endgame.solve(state, [player.card_options for player in game.players], self.deadline)
+        finally:
+            self.nodes += self.endgame.nodes - nodes
+        move, rank = random.choice(moves)
+        row, column = state.ply(move)
+        final_alter_scores = {player: scores[i] - player.score for i, player in enumerate(game.players)}
+        values = self.heuristic_eval(game, final_alter_scores, p_turn, 1)
+        return values, Ply(game.players[p_turn].in_hand(RANKS[rank]), row, column)
+
+    @staticmethod
+    def table_key(game, p_turn, alter_scores):
+        """Position key: board, player to move, remaining hands and the score totals the evaluation depends on"""
+        return (game.board.zobrist, p_turn, tuple(p.hand_hash for p in game.players),
+                tuple(p.score + alter_scores[p] for p in game.players))
+
+    def canonical_key(self, game, p_turn, alter_scores):
+        """(key, symmetry): table_key with the board's canonical hash when self.symmetry, and the symmetry taking
+        the board to its canonical image. Plies in the table are stored as played on that image. Once the blanks
+        are filled the board holds 12 or more player cards, no two alike, so no symmetry leaves a position as it is
+        and an image of it is practically never within reach: the raw hash is kept then. The canonical hash being the
+        raw hash of an image, the two kinds of key can share the table"""
+        if not self.symmetry or not game.board.get_empty():
+            return self.table_key(game, p_turn, alter_scores), 0
+        zobrist, symmetry = game.board.canonical()
+        return (zobrist, p_turn, tuple(p.hand_hash for p in game.players),
+                tuple(p.score + alter_scores[p] for p in game.players)), symmetry
+
+    @staticmethod
+    def map_ply(game, ply, symmetry):
+        """ply moved by the board symmetry of that index"""
+        if not symmetry:
+            return ply
+        return Ply(ply.card, *game.board.symmetries[symmetry][1][ply.row, ply.column])
+
     # recursive search of future moves to the given depth
-    def tree_search(self, game, depth, p_turn, alter_scores):
+    def tree_search(self, game, depth, p_turn, alter_scores, plies=None):
         # p_turn = game.p_turn
+        if self.table is not None:
+            key, symmetry = self.canonical_key(game, p_turn, alter_scores)
+            entry = self.table.probe(key, depth)
+            if entry is not None:
+                return entry[0], self.map_ply(game, entry[1], INVERSE_SYMMETRY[symmetry])
         player = game.players[p_turn]
-        plies = player.enum_plies(game, p_turn)
+        if plies is None:
+            plies = player.enum_plies(game, p_turn)
         best = ''
-        # Store a copy of board cards to put back later
-        stored_cards = game.board.cards
-        for ply in plies:
-            new_alter_scores, new_p_turn, gameover, discard = game.test_move(ply, p_turn, alter_scores.copy())
-            if gameover or depth == 0:
-                node_values = self.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)
+        leaf_values = None
+        if depth == 0:
+            plies = list(plies)
+            leaf_values = self.batch_values(game, p_turn, alter_scores, plies)
+        for i, ply in enumerate(plies):
+            self.nodes += 1
+            self.check_time()
+            if leaf_values is not None:
+                node_values = leaf_values[i]
             else:
-                node_values = self.tree_search(game, depth - 1, new_p_turn, new_alter_scores)[0]
-
-            # Undo move by
-            ply.card.played = False
-            discard.discarded = False
-            # Restore the board's cards
-            game.board.cards = stored_cards
+                new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy())
+                if gameover or depth == 0:
+                    node_values = self.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)
+                else:
+                    node_values = self.tree_search(game, depth - 1, new_p_turn, new_alter_scores)[0]
+                game.untest_move(token)
             if best == '' or node_values[player] > best[player]:
                 best = node_values
                 bestplies = [ply]
@@ -381,53 +1568,300 @@ class AITreeSearch(Player):
                 # noinspection PyUnboundLocalVariable
                 bestplies.append(ply)
         bestply = random.choice(bestplies)
+        if self.table is not None:
+            # noinspection PyUnboundLocalVariable
+            self.table.store(key, depth, best, self.map_ply(game, bestply, symmetry))
         return best, bestply
 
+    def root_search(self, game, depth, p_turn, alter_scores):
+        """Root of the pruned modes"""
+        plies = self.order_plies(game, p_turn, depth, self.root_plies(game, p_turn))
+        return self.pick(self.score_plies(game, depth, p_turn, alter_scores, plies))
+
+    def parallel_search(self, game, depth, p_turn, alter_scores):
+        """Root split: the root plies are dealt out to worker processes, which get a snapshot of the position
+        rather than the game itself"""
+        plies = self.root_plies(game, p_turn)
+        snapshot = game.snapshot(alter_scores)
+        keys = [(ply.card.name, ply.row, ply.column) for ply in plies]
+        n = min(self.workers, len(plies))
+        pool = process_pool(self.workers)
+        options = self.worker_options()
+        futures = [pool.submit(search_root_plies, snapshot, keys[i::n], depth, options, self.deadline)
+                   for i in range(n)]
+        values = [None] * len(plies)
+        for i, future in enumerate(futures):
+            try:
+                chunk, nodes = future.result()
+            except SearchTimeout:
+                for f in futures:
+                    f.cancel()
+                raise
+            values[i::n] = chunk
+            self.nodes += nodes
+        return self.pick(list(zip(plies, values)))
+
+    def worker_options(self):
+        """Keyword arguments of AITreeSearch giving parallel_search's workers this searcher's options, bar the ones
+        about whole moves"""
+        return {'card_options': self.card_options, 'mode': self.mode,
+                'table_size': self.table.size if self.table is not None else 0, 'endgame_plies': self.endgame_plies,
+                'symmetry': self.symmetry, 'ordering': self.ordering, 'batch': self.batch}
+
+    @staticmethod
+    def pick(scored):
+        """Best (value, ply) of scored plies, breaking ties at random"""
+        best = max(value for _, value in scored)
+        return best, random.choice([ply for ply, value in scored if value == best])
+
+    def score_plies(self, game, depth, p_turn, alter_scores, plies):
+        """Searches each of plies from the root, returning a list of (ply, mover's value). Later plies are searched
+        with a window just below the best value so far, so ties are still found but a ply that falls short may get
+        a bound rather than its value, always below that best"""
+        player = game.players[p_turn]
+        if depth == 0:
+            plies = list(plies)
+            leaf_values = self.batch_values(game, p_turn, alter_scores, plies)
+            if leaf_values is not None:
+                self.nodes += len(plies)
+                self.check_time()
+                return [(ply, values[player]) for ply, values in zip(plies, leaf_values)]
+        pair_bound = self.pair_bound(game, depth)
+        best = None
+        out = []
+        for ply in plies:
+            self.nodes += 1
+            self.check_time()
+            new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy())
+            if gameover or depth == 0:
+                value = self.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)[player]
+            elif self.mode == 'maxn':
+                value = self.tree_search(game, depth - 1, new_p_turn, new_alter_scores)[0][player]
+            elif self.mode == 'paranoid':
+                alpha = -float('inf') if best is None else best - EPS
+                value = self.paranoid_search(game, depth - 1, new_p_turn, new_alter_scores, alpha, float('inf'),
+                                             player)
+            elif self.mode == 'brs':
+                alpha = -float('inf') if best is None else best - EPS
+                value = self.brs_search(game, depth - 1, p_turn, new_alter_scores, alpha, float('inf'), False)
+            else:
+                bound = float('inf') if best is None else pair_bound - best
+                value = self.shallow_search(game, depth - 1, new_p_turn, new_alter_scores, bound)[player]
+            game.untest_move(token)
+            if best is None or value > best:
+                best = value
+            out.append((ply, value))
+        return out
+
+    def paranoid_search(self, game, depth, p_turn, alter_scores, alpha, beta, root):
+        """Alpha-beta on root's value, assuming every other player is out to minimise it"""
+        if self.table is not None:
+            key, symmetry = self.canonical_key(game, p_turn, alter_scores)
+            key += (game.players.index(root),)
+            entry = self.table.probe(key, depth)
+            if entry is not None:
+                value, _, flag = entry
+                if flag == EXACT or (flag == LOWER and value >= beta) or (flag == UPPER and value <= alpha):
+                    return value
+            first = self.table_ply(game, key, symmetry)
+        else:
+            first = None
+        if self.stats is not None:
+            self.stats.searched += 1
+        window = alpha, beta
+        player = game.players[p_turn]
+        maximise = player is root
+        best = None
+        bestply = None
+        for tried, ply in enumerate(self.order_plies(game, p_turn, depth, player.enum_plies(game, p_turn), first)):
+            self.nodes += 1
+            self.check_time()
+            new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy())
+            if gameover or depth == 0:
+                value = self.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)[root]
+            else:
+                value = self.paranoid_search(game, depth - 1, new_p_turn, new_alter_scores, alpha, beta, root)
+            game.untest_move(token)
+            if maximise:
+                if best is None or value > best:
+                    best = value
+                    bestply = ply
+                    alpha = max(alpha, value)
+            elif best is None or value < best:
+                best = value
+                bestply = ply
+                beta = min(beta, value)
+            if alpha >= beta:
+                self.cutoff(game, p_turn, ply, depth, tried)
+                break
+        if self.table is not None:
+            flag = UPPER if best <= window[0] else LOWER if best >= window[1] else EXACT
+            # noinspection PyUnboundLocalVariable
+            self.table.store(key, depth, best, self.map_ply(game, bestply, symmetry), flag)
+        return best
+
+    def shallow_search(self, game, depth, p_turn, alter_scores, bound):
+        """Max^n with shallow pruning. Once the player here can beat bound, the parent's player is left less than
+        they already have elsewhere (see WIN_PAIR_BOUND), so the remaining plies are skipped"""
+        if self.table is not None:
+            key, symmetry = self.canonical_key(game, p_turn, alter_scores)
+            entry = self.table.probe(key, depth)
+            if entry is not None:
+                return entry[0]
+            first = self.table_ply(game, key, symmetry)
+        else:
+            first = None
+        if self.stats is not None:
+            self.stats.searched += 1
+        player = game.players[p_turn]
+        pair_bound = self.pair_bound(game, depth)
+        best = None
+        bestply = None
+        for tried, ply in enumerate(self.order_plies(game, p_turn, depth, player.enum_plies(game, p_turn), first)):
+            self.nodes += 1
+            self.check_time()
+            new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy())
+            if gameover or depth == 0:
+                node_values = self.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)
+            else:
+                child_bound = float('inf') if best is None else pair_bound - best[player]
+                node_values = self.shallow_search(game, depth - 1, new_p_turn, new_alter_scores, child_bound)
+            game.untest_move(token)
+            if best is None or node_values[player] > best[player]:
+                best = node_values
+                bestply = ply
+                if best[player] > bound:
+                    # Values below a cutoff are incomplete, so only stored when the node was searched in full
+                    self.cutoff(game, p_turn, ply, depth, tried)
+                    return best
+        if self.table is not None:
+            # noinspection PyUnboundLocalVariable
+            self.table.store(key, depth, best, self.map_ply(game, bestply, symmetry))
+        return best
+
+    @staticmethod
+    def pair_bound(game, depth):
+        """Largest sum of two players' values among the leaves of a search of depth from here"""
+        if sum(len(p.hand) for p in game.players) > depth + 1:
+            return 0
+        return WIN_PAIR_BOUND
+
+    def brs_search(self, game, depth, root_turn, alter_scores, alpha, beta, maximise):
+        """Best-reply search: alpha-beta on the root player's value where, between two root moves, only the single
+        opponent move that hurts the root most is played and the other opponents pass"""
+        root = game.players[root_turn]
+        if maximise:
+            movers = [root_turn] if root.hand else []
+        else:
+            movers = [i for i, p in enumerate(game.players) if p is not root and p.hand]
+        if not movers:
+            return self.heuristic_eval(game, alter_scores, root_turn, False)[root]
+        if self.stats is not None:
+            self.stats.searched += 1
+        best = None
+        tried = 0
+        for p_turn in movers:
+            for ply in self.order_plies(game, p_turn, depth, game.players[p_turn].enum_plies(game, p_turn)):
+                self.nodes += 1
+                self.check_time()
+                next_turn = None if maximise else root_turn
+                new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy(),
+                                                                               next_turn)
+                if gameover or depth == 0:
+                    value = self.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)[root]
+                else:
+                    value = self.brs_search(game, depth - 1, root_turn, new_alter_scores, alpha, beta, not maximise)
+                game.untest_move(token)
+                if maximise:
+                    if best is None or value > best:
+                        best = value
+                        alpha = max(alpha, value)
+                elif best is None or value < best:
+                    best = value
+                    beta = min(beta, value)
+                if alpha >= beta:
+                    self.cutoff(game, p_turn, ply, depth, tried)
+                    return best
+                tried += 1
+        return best
+
+    def table_ply(self, game, key, symmetry):
+        """The best ply the table holds for key, from a search of any depth, as (card name, row, column), or None"""
+        if not self.ordering:
+            return None
+        ply = self.table.best_ply(key)
+        if ply is None:
+            return None
+        ply = self.map_ply(game, ply, INVERSE_SYMMETRY[symmetry])
+        return ply.card.name, ply.row, ply.column
+
+    def order_plies(self, game, p_turn, depth, plies, first=None):
+        """plies in the order to search them: first (the table's best ply), then the killers at this ply from the
+        root, then by the mover's one-ply gain on the board over everyone else where depth leaves a subtree worth the
+        look, then by the history table. Unchanged without self.ordering"""
+        if not self.ordering:
+            return plies
+        killers = self.killers.get(len(game.tested), ())
+        history = self.history
+        board = game.board
+        player = game.players[p_turn]
+        keyed = []
+        for ply in plies:
+            move = (ply.card.name, ply.row, ply.column)
+            gain = 0
+            if depth >= ORDERING_GAIN_DEPTH:
+                token, error = board.make_move(ply)
+                gain = 2 * board.score(player) - sum(board.score(p) for p in game.players)
+                board.unmake_move(token)
+            keyed.append(((move == first, move in killers, gain, history.get((p_turn,) + move, 0)), ply))
+        # Stable, so plies alike keep enum_plies order
+        keyed.sort(key=lambda x: x[0], reverse=True)
+        return [ply for _, ply in keyed]
+
+    def cutoff(self, game, p_turn, ply, depth, tried):
+        """Counts a cutoff by ply, the tried'th from 0 searched here, and makes it a killer and credits its history"""
+        if self.stats is not None:
+            self.stats.cutoffs += 1
+            self.stats.first_cutoffs += not tried
+        if self.ordering:
+            move = (ply.card.name, ply.row, ply.column)
+            killers = self.killers.setdefault(len(game.tested), [])
+            if move not in killers:
+                killers.insert(0, move)
+                del killers[2:]
+            key = (p_turn,) + move
+            self.history[key] = self.history.get(key, 0) + (depth + 1) ** 2
+
     # returns the value of the current game for each player in a three-item list
     # trying to take into account immediate future moves without doing a tree search
     # (so that this evaluation doesn't favour the player who just played)
 
-    # noinspection PyProtectedMember
+    def batch_values(self, game, p_turn, alter_scores, plies):
+        """batch.child_values of plies if this search batches and can here, else None"""
+        if not self.batch or self.stats is not None:
+            return None
+        import batch
+        if not batch.AVAILABLE:
+            return None
+        return batch.child_values(game, p_turn, alter_scores, plies)
+
     @staticmethod
     def heuristic_eval(game, alter_scores, p_turn, gameover):
         if not gameover:
+            # Kept in 1/POSITIONAL_SCALE points, so the sums are exact whatever order they are made in
+            board = game.board
             num_players = len(game.players)
-            values = {p: 0 for p in game.players}
-            # Catch non player cards
-            values[None] = 0
-            # add some value for cards not currently in scoring positions
-            central = (game.board.size // 2 - 1, game.board.size // 2, game.board.size // 2 + 1)
-            # TODO: Work out scoring for other sized boards - where are scoring pos etc.
-            # Only worry about outer rows here, inner is counted by score
-            rows = [0, game.board.size - 1]
-            columns = [0, game.board.size - 1]
-            for r in rows:
-                for c in columns:
-                    card = game.board._cards[r][c]
-                    values[card.player] += 0.2 * card.value
-                for c in central:
-                    card = game.board._cards[r][c]
-                    values[card.player] += 0.5 * card.value
-            for c in columns:
-                for r in central:
-                    card = game.board._cards[r][c]
-                    values[card.player] += 0.5 * card.value
-            del values[None]
-            # for row, x in enumerate(game.board._cards):
-            #     for column, card in enumerate(x):
-            #         if row in central or column in central:
-            #             values[card.player] += 0.5 * card.value
-            #         else:
-            #             values[card.player] += 0.2 * card.value
+            values = {}
+            total = 0
             for i, player in enumerate(game.players):
                 waittime = (i - p_turn) % num_players  # plies until your next ply
                 score = player.score + alter_scores[player]
-                boardscore = game.board.score(player) * (1 + num_players - waittime)  # how good the board is
-                #hand_potential = sum(c.value for c in player.hand if not c.played)
-                values[player] += score +  boardscore #+ 0.4 * hand_potential
-            s = sum(values.values())
+                boardscore = board.score(player) * (1 + num_players - waittime)  # how good the board is
+                # The board keeps the value of the player's cards not in scoring positions as it is updated
+                values[player] = POSITIONAL_SCALE * (score + boardscore) + board.positional(player)
+                total += values[player]
             for k, v in values.items():
-                values[k] = 2 * v - s  # I.e. subtract others
+                values[k] = (2 * v - total) / POSITIONAL_SCALE  # I.e. subtract others
         else:
             # TODO: Should we differentiate between winning states? E.g probability of winning, margin of winning?
             # losers have a large negative score
@@ -449,6 +1883,143 @@ class AITreeSearch(Player):
         return values
 
 
+class MCTSNode:
+    """Position in AIMCTSPlayer's tree, reached by ply (card name, row, column) from its parent"""
+    def __init__(self, ply, p_turn, key, parent=None, terminal=False):
+        self.ply = ply
+        self.p_turn = p_turn  # seat to play here
+        self.key = key  # AITreeSearch.table_key of the position, to find it again on a later turn
+        self.parent = parent
+        self.terminal = terminal
+        self.children = []
+        self.untried = None  # plies not yet expanded, listed on the first visit
+        self.visits = 0
+        self.rewards = None  # total reward per seat
+
+    def uct_child(self, exploration):
+        log_n = math.log(self.visits)
+        seat = self.p_turn
+        return max(self.children, key=lambda c: c.rewards[seat] / c.visits + exploration * math.sqrt(log_n / c.visits))
+
+    def find(self, key, depth):
+        """Node with key at most depth plies below this one, or None"""
+        nodes = [self]
+        for _ in range(depth + 1):
+            for node in nodes:
+                if node.key == key:
+                    return node
+            nodes = [child for node in nodes for child in node.children]
+        return None
+
+
+class AIMCTSPlayer(Player):
+    """Monte Carlo tree search with UCT. Each iteration walks the tree by UCT, adds one node and plays the game out
+    with a playout.py policy. Rewards are per seat, mixing a share of the win with the share of the points, and every
+    seat picks its own best child as in max^n. The tree is kept and its node for the new position reused next turn"""
+    def __init__(self, name, suit, iterations=300, time_limit=None, policy='random', exploration=1.4,
+                 score_weight=0.5, card_options=1, reuse=True):
+        import playout
+        super().__init__(name, suit, card_options)
+        self.AI = True
+        if policy not in playout.POLICIES:
+            raise Exception('Unknown playout policy {}, choose from {}'.format(policy, playout.POLICIES))
+        self.iterations = iterations  # per move, unless time_limit (seconds) is given
+        self.time_limit = time_limit
+        self.policy = policy
+        self.exploration = exploration
+        self.score_weight = score_weight
+        self.reuse = reuse
+        self.tree = None  # node chosen last move, searched for the new position
+        self.reused = 0  # visits inherited by the last make_move
+        self.t_game = None
+
+    def make_move(self, game_state):
+        game = self.t_game = Game(game_state, autostart=False)
+        root = self.find_root(game)
+        self.reused = root.visits
+        deadline = time.time() + self.time_limit if self.time_limit is not None else None
+        n = 0
+        while (n < self.iterations) if deadline is None else (time.time() < deadline or n == 0):
+            self.iterate(game, root)
+            n += 1
+        best = max(root.children, key=lambda c: c.visits)
+        self.tree = best if self.reuse else None
+        name, row, column = best.ply
+        return Ply(self.in_hand(name), row, column)
+
+    def timed_move(self, game_state, time_budget, verbose=None):
+        own_limit = self.time_limit
+        if own_limit is None or time_budget < own_limit:
+            self.time_limit = time_budget
+        try:
+            return self.make_move(game_state)
+        finally:
+            self.time_limit = own_limit
+
+    def find_root(self, game):
+        alter_scores = {player: 0 for player in game.players}
+        key = AITreeSearch.table_key(game, game.p_turn, alter_scores)
+        if self.tree is not None:
+            node = self.tree.find(key, len(game.players))
+            if node is not None:
+                node.parent = None
+                node.ply = None
+                return node
+        return MCTSNode(None, game.p_turn, key)
+
+    def iterate(self, game, root):
+        """One selection, expansion, playout and backup"""
+        import playout
+        alter_scores = {player: 0 for player in game.players}
+        node = root
+        gameover = node.terminal
+        # Selection
+        while not gameover and node.untried == [] and node.children:
+            node = node.uct_child(self.exploration)
+            alter_scores, p_turn, gameover, token = game.test_move(self.ply(game, node.parent.p_turn, node.ply),
+                                                                   node.parent.p_turn, alter_scores)
+        # Expansion
+        if not gameover:
+            if node.untried is None:
+                node.untried = [(ply.card.name, ply.row, ply.column)
+                                for ply in game.players[node.p_turn].enum_plies(game, node.p_turn)]
+            ply = node.untried.pop(random.randrange(len(node.untried)))
+            alter_scores, p_turn, gameover, token = game.test_move(self.ply(game, node.p_turn, ply), node.p_turn,
+                                                                   alter_scores)
+            child = MCTSNode(ply, p_turn, AITreeSearch.table_key(game, p_turn, alter_scores), node, bool(gameover))
+            node.children.append(child)
+            node = child
+        # Playout
+        if gameover:
+            scores = [player.score + alter_scores[player] for player in game.players]
+        else:
+            scores = playout.PlayoutState.from_game(game, node.p_turn, alter_scores).playout(self.policy)
+        rewards = self.rewards(scores)
+        game.untest_all()
+        # Backup
+        while node is not None:
+            node.visits += 1
+            if node.rewards is None:
+                node.rewards = rewards[:]
+            else:
+                for i, r in enumerate(rewards):
+                    node.rewards[i] += r
+            node = node.parent
+
+    @staticmethod
+    def ply(game, p_turn, ply):
+        name, row, column = ply
+        return Ply(game.players[p_turn].in_hand(name), row, column)
+
+    def rewards(self, scores):
+        """Reward per seat of a finished game's scores: a share of the win and of the points"""
+        best = max(scores)
+        winners = scores.count(best)
+        total = sum(scores)
+        return [(1 - self.score_weight) * (score == best) / winners +
+                self.score_weight * (score / total if total else 1 / len(scores)) for score in scores]
+
+
 # the information which players are sent to make their move
 class GameState:
     def __init__(self, board, players, plyhistory, p_turn, gameover):
@@ -493,25 +2064,45 @@ class StartGameState(GameState):
         super().__init__(board, players, [], 0, False)
 
 
+# One journal record per change: b'm' with the card's RANKS index, row and column for a ply, or b'u' for an undo,
+# numbered so records already in the checkpoint are skipped
+JOURNAL_RECORD = struct.Struct('<cIBBB')
+
+
 class Game:
-    def __init__(self, game_state, fname='', save=1, load=1, autostart=True):
+    def __init__(self, game_state, fname='', save=1, load=1, autostart=True, journal=False, checkpoint_every=12):
+        # In journal mode each ply appends a record to fname.journal and fname is only rewritten, as a checkpoint,
+        # every checkpoint_every records
+        self.journal = journal
+        self.checkpoint_every = checkpoint_every
+        self.journal_seq = 0  # number of the last record
+        self.checkpoint_seq = 0  # number of the last record included in the checkpoint
+        replay = []
         if fname != '':
             self.fname = fname
+            self.journal_fname = fname + '.journal'
             self.save = save
             if load:
                 try:
                     game_state = self.load()
+                    if journal:
+                        replay = self.read_journal()
                 except FileNotFoundError:
                     print('No file {} found. Using input GameState'.format(fname))
         else:
             self.save = 0
             self.fname = 'err.pi'
+            self.journal_fname = 'err.pi.journal'
         self.board = game_state.board
         self.players = game_state.players
         self.plyhistory = game_state.plyhistory
         self.p_turn = game_state.p_turn
         self.gameover = game_state.gameover
         self.plyhistory = []
+        self.undo_stack = []
+        self.tested = []  # tokens of test_move plies not yet taken back
+        if replay:
+            self.replay(replay)
         if self.save:
             self.dump()
         if autostart:
@@ -542,7 +2133,9 @@ class Game:
         error = self.make_move(ply)
         return error
 
-    def online_turn(self, card, row, column):
+    def online_turn(self, card, row, column, time_budget=5):
+        """Plays a human ply then AI plies until a human is next. The time budget is shared between the AI plies,
+        each getting an equal share of what is left"""
         t = time.time()
         self.gameover = False
         player = self.players[self.p_turn]
@@ -559,74 +2152,97 @@ class Game:
         while error == "Done" and self.players[self.p_turn].AI and not self.gameover:
             player = self.players[self.p_turn]
             print(player, 'turn')
-            ply = player.make_move(self.get_game_state())
+            share = (t + time_budget - time.time()) / self.ai_turns_ahead()
+            ply = player.timed_move(self.get_game_state(), max(share, 0))
             error = self.make_move(ply)
             # Timeout
-            if time.time() - t > 5:
+            if time.time() - t > time_budget:
                 break
         return error
 
+    def ai_turns_ahead(self):
+        """Number of AI plies from now until a human is to play or the game ends"""
+        plies_left = sum(len(p.hand) for p in self.players)
+        n = 0
+        while n < plies_left and self.players[(self.p_turn + n) % len(self.players)].AI:
+            n += 1
+        return max(n, 1)
+
     def make_move(self, ply):
         player = self.players[self.p_turn]
-        discard, error = self.board.update(ply)
-        self.plyhistory.append((ply, discard))
+        token, error = self.board.make_move(ply)
         if error:
             if player.AI:
                 raise Exception("AI error: {} trying {} in\n{}".format(error, ply, self.board))
             else:
                 return error
         else:
+            self.plyhistory.append((ply, token[0]))
             player.play(ply.card)
+            undo = (token, self.p_turn, ply.card, len(self.plyhistory) - 1)
             self.p_turn = (self.p_turn + 1) % len(self.players)
             next_player = self.players[self.p_turn]
             if not next_player.hand:
                 self.final()
+                delta = 0
             else:
-                next_player.alter_score(self.board.score(next_player))
+                delta = self.board.score(next_player)
+                next_player.alter_score(delta)
+            self.undo_stack.append(undo + (delta,))
             if self.save:
-                self.dump()
+                self.record(b'm', ply)
             return 'Done'
 
-    def test_move(self, ply, p_turn, alter_scores):
+    def test_move(self, ply, p_turn, alter_scores, next_turn=None):
+        """Plays ply for the search, tracking scores in alter_scores instead of on the players. The returned token
+        is passed to untest_move to take the ply back. next_turn overrides who plays next, for best-reply search"""
         player = self.players[p_turn]
-        discard, error = self.board.update(ply, test=1)
-        # self.plyhistory.append((ply, discard))
+        token, error = self.board.make_move(ply)
         if error:
             if player.AI:
                 raise Exception("AI error: {} trying {} in\n{}".format(error, ply, self.board))
             else:
                 return error
         else:
-            ply.card.played = True
-            p_turn = (p_turn + 1) % len(self.players)
+            player.play(ply.card)
+            token = (token, player, ply.card)
+            self.tested.append(token)
+            p_turn = (p_turn + 1) % len(self.players) if next_turn is None else next_turn
             next_player = self.players[p_turn]
-            if not next_player.hand or not any(not c.played for c in next_player.hand):
+            if not next_player.hand:
                 for player in self.players:
                     alter_scores[player] += self.board.score(player)
                 gameover = 1
             else:
                 alter_scores[next_player] += self.board.score(next_player)
                 gameover = 0
-            return alter_scores, p_turn, gameover, discard
-
-    # def unmake_move(self):
-    #     player = self.players[self.p_turn]
-    #     (unply, undiscard) = self.plyhistory.pop()
-    #     if self.gameover:
-    #         self.unfinal()
-    #     else:
-    #         player.alter_score(-self.board.score(player))
-    #
-    #     self.p_turn = (self.p_turn - 1) % len(self.players)
-    #     lastplayer = self.players[self.p_turn]
-    #
-    #     lastplayer.unplay(unply.card)
-    #     undiscard, error = self.board.update(unply, True, undiscard)
-    #     if error:
-    #         raise Exception("Unmake move error")
-    #     if self.save:
-    #         self.dump()
-    #     return unply
+            return alter_scores, p_turn, gameover, token
+
+    def untest_move(self, token):
+        board_token, player, card = token
+        self.tested.pop()
+        player.unplay(card)
+        self.board.unmake_move(board_token)
+
+    def untest_all(self):
+        """Takes back every test_move ply still on the board, e.g. after a search is abandoned"""
+        while self.tested:
+            self.untest_move(self.tested[-1])
+
+    def unmake_move(self):
+        """Takes back the last ply played with make_move"""
+        token, p_turn, card, n_history, delta = self.undo_stack.pop()
+        if self.gameover:
+            self.unfinal()
+        else:
+            self.players[self.p_turn].alter_score(-delta)
+        self.p_turn = p_turn
+        self.players[p_turn].unplay(card)
+        self.board.unmake_move(token)
+        del self.plyhistory[n_history:]
+        if self.save:
+            self.record(b'u')
+        return card
 
     def final(self):
         self.gameover = True
@@ -641,7 +2257,7 @@ class Game:
         if PRINT:
             print("\nFinal board:")
             print(game_state)
-        if self.save:
+        if self.save and not self.journal:
             self.dump()
         return game_state.statement()
 
@@ -651,20 +2267,108 @@ class Game:
         for player in self.players:
             score = self.board.score(player)
             player.alter_score(-score)
-        if self.save:
+        if self.save and not self.journal:
             self.dump()
         return True
 
     def get_game_state(self):
         return GameState(self.board, self.players, self.plyhistory, self.p_turn, self.gameover)
 
+    def snapshot(self, alter_scores=None):
+        """Compact, picklable copy of the position: board codes, blank cells, and each player's name, suit, score,
+        card options and hand by card name. alter_scores (as used in a search) are added to the scores"""
+        players = []
+        for p in self.players:
+            score = p.score + (alter_scores[p] if alter_scores else 0)
+            players.append((p.name, p.suit, score, p.card_options, tuple(c.name for c in p.hand)))
+        empty = tuple((r - 1, c - 1) for r, c in self.board.get_empty())
+        return self.board.size, tuple(self.board.codes(self.players)), empty, tuple(players), self.p_turn, \
+            self.gameover
+
+    @staticmethod
+    def from_snapshot(snapshot, player_cls=None):
+        """Game, not started, rebuilt from snapshot() on a CompactBoard. Players are plain Player instances unless
+        player_cls is given"""
+        size, codes, empty, player_data, p_turn, gameover = snapshot
+        players = []
+        for name, suit, score, card_options, hand in player_data:
+            player = (player_cls or Player)(name, suit)
+            player.card_options = card_options
+            player.score = score
+            for card in [c for c in player.hand if c.name not in hand]:
+                player.play(card)
+            players.append(player)
+        board = CompactBoard.from_codes(size, codes, list(empty), players)
+        return Game(GameState(board, players, [], p_turn, gameover), autostart=False)
+
+    def record(self, kind, ply=None):
+        """Saves the game after a ply (kind b'm') or an undo (b'u'): a full dump, or in journal mode one record,
+        with a checkpoint instead every checkpoint_every records. An undo is always a checkpoint, since the ply it
+        takes back may be from before the last one, where a reloaded game has no undo token for it"""
+        if not self.journal:
+            self.dump()
+            return
+        self.journal_seq += 1
+        if kind == b'u' or self.journal_seq - self.checkpoint_seq >= self.checkpoint_every:
+            self.dump()
+        else:
+            if ply is None:
+                data = JOURNAL_RECORD.pack(kind, self.journal_seq, 0, 0, 0)
+            else:
+                data = JOURNAL_RECORD.pack(kind, self.journal_seq, RANK_INDEX[ply.card.name], ply.row, ply.column)
+            with open(self.journal_fname, 'ab') as f:
+                f.write(data)
+
+    def read_journal(self):
+        """Records in the journal, ignoring a partly written last one"""
+        try:
+            with open(self.journal_fname, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return []
+        end = len(data) - len(data) % JOURNAL_RECORD.size
+        return list(JOURNAL_RECORD.iter_unpack(data[:end]))
+
+    def replay(self, records):
+        """Replays journal records made after the checkpoint that was loaded"""
+        save, self.save = self.save, 0
+        for kind, seq, rank, row, column in records:
+            if seq <= self.checkpoint_seq:
+                continue
+            if kind == b'm':
+                card = self.players[self.p_turn].in_hand(RANKS[rank])
+                if not card or self.make_move(Ply(card, row, column)) != 'Done':
+                    raise Exception('Journal {} record {} does not fit the game'.format(self.journal_fname, seq))
+            elif self.undo_stack:
+                # Undo records only come from journals written before undos were checkpoints
+                self.unmake_move()
+            else:
+                raise Exception('Journal {} record {} undoes a ply from before the checkpoint'.format(
+                    self.journal_fname, seq))
+            self.journal_seq = seq
+        self.save = save
+
     def dump(self):
-        with open(self.fname, 'wb') as f:
-            pickle.dump(self.get_game_state(), f)
+        """Saves the game state in the binary format of savefile.py. In journal mode this is a checkpoint: it also
+        holds the number of the last record it includes, and the journal starts again"""
+        import savefile
+        with open(self.fname + '.tmp', 'wb') as f:
+            f.write(savefile.dumps_game_state(self.get_game_state(), self.journal_seq))
+        os.replace(self.fname + '.tmp', self.fname)
+        if self.journal:
+            self.checkpoint_seq = self.journal_seq
+            open(self.journal_fname, 'wb').close()
 
     def load(self):
+        """Loads a binary save. Pickle saves are not loaded, see savefile.convert"""
+        import savefile
         with open(self.fname, 'rb') as f:
-            return pickle.load(f)
+            data = f.read()
+        savefile.check_binary(data, self.fname)
+        game_state, seq = savefile.loads_game_state(data)
+        if self.journal:
+            self.journal_seq = self.checkpoint_seq = seq
+        return game_state
 
 
 #
@@ -678,47 +2382,69 @@ class Game:
 
 def main(fname='curling.pi'):
     t = time.time()
-    board = Board(empty="Default")
+    board = CompactBoard(empty="Default")
     players = [AITreeSearch('Matt', chr(9829), 2),
                AITreeSearch('F. Rob', chr(9830), 2),
                AITreeSearch('Rob H.', chr(9827), 2)]
     game_state = StartGameState(board, players)
-    Game(game_state, fname=fname, save=0, load=0)
+    game = Game(game_state, fname=fname, save=0, load=0)
     print("\nTime is:", time.time() - t)
+    return [player.score for player in game.players]
+
+
+def averages(runs, lineup=('tree:2', 'tree:2', 'tree:2'), workers=None):
+    import tournament
+    return tournament.tournament(lineup, runs, workers=workers)
 
 
-def averages(runs):
+def compare_search_modes(positions=10, depth=2, seed=0, modes=SEARCH_MODES, card_options=1):
+    """Searches random positions in each mode, reporting nodes against max^n and how often the chosen ply is one
+    max^n rates best. Returns {mode: [nodes, plies max^n rates best]}. Only shallow has to agree every time, see
+    SEARCH_MODES"""
     global PRINT
-    PRINT = False
-    results = []
-    for _ in range(runs):
-        results.append(main())
-
-    end = [0, 0, 0]
-    diff = [0, 0, 0]
-    av_m = []
-    for a, b, c in results:
-        m = max(a, b, c)
-        if a == m:
-            end[0] += 1
-        if b == m:
-            end[1] += 1
-        if c == m:
-            end[2] += 1
-
-        diff[0] += a - b
-        diff[1] += b - c
-        diff[2] += c - a
-        av_m.append(m)
-
-    print(end)
-    for i in range(3):
-        diff[i] /= runs
-    for i in range(len(results[0])):
-        print(sum(x[i] for x in results) / runs)
-
-    print(diff)
-    print(sum(av_m) / runs)
+    verbose = PRINT
+    rng = random.Random(seed)
+    games = []
+    for _ in range(positions):
+        players = [AIPlayer('A', chr(9829)), AIPlayer('B', chr(9830)), AIPlayer('C', chr(9827))]
+        for player in players:
+            player.card_options = card_options
+        game = Game(StartGameState(CompactBoard(), players), save=0, load=0, autostart=False)
+        PRINT = False
+        random.seed(rng.random())
+        for _ in range(rng.randrange(3 * len(RANKS) - 1)):
+            game.turn()
+        games.append(game)
+
+    results = {mode: [0, 0] for mode in modes}
+    for game in games:
+        alter_scores = {player: 0 for player in game.players}
+        player = game.players[game.p_turn]
+        searcher = AITreeSearch('compare', '', depth)
+        # Max^n value of every root ply, to judge the other modes' choices
+        maxn_values = {}
+        for ply in player.enum_plies(game, game.p_turn):
+            new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, game.p_turn, alter_scores.copy())
+            if gameover or depth == 0:
+                values = searcher.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)
+            else:
+                values = searcher.tree_search(game, depth - 1, new_p_turn, new_alter_scores)[0]
+            game.untest_move(token)
+            maxn_values[ply.card.name, ply.row, ply.column] = values[player]
+        for mode in modes:
+            searcher = AITreeSearch('compare', '', depth, mode=mode)
+            random.seed(seed)
+            ply = searcher.search(game, depth, game.p_turn, alter_scores)[1]
+            results[mode][0] += searcher.nodes
+            results[mode][1] += maxn_values[ply.card.name, ply.row, ply.column] == max(maxn_values.values())
+    PRINT = verbose
+
+    base = results['maxn'][0] if 'maxn' in results else None
+    print('{:>10} {:>10} {:>8} {:>8}'.format('mode', 'nodes', 'of maxn', 'agree'))
+    for mode, (nodes, agree) in results.items():
+        print('{:>10} {:>10} {:>8} {:>7.0f}%'.format(mode, nodes, '{:.2f}'.format(nodes / base) if base else '-',
+                                                      100 * agree / positions))
+    return results
 
 
 if __name__ == '__main__':
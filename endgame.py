@@ -0,0 +1,95 @@
+"""Exact endgame solving. Once few plies are left the whole remaining tree is searched on a playout.PlayoutState to
+the final scores, each player choosing the reply best for themselves as in max^n: a win (shared with anyone tied)
+first, then their own score. Results are memoized by position, so positions met again, on the next ply or in a
+later game, cost one lookup."""
+import time
+
+from curling2 import BLANK, RANKS, SearchTimeout
+from playout import CHOICES, LOWEST, PICK
+
+
+def utility(scores, seat):
+    """What seat is playing for: its share of the win, then its score"""
+    best = max(scores)
+    return (scores[seat] == best) / scores.count(best), scores[seat]
+
+
+class EndgameSolver:
+    def __init__(self, max_entries=10 ** 6):
+        self.memo = {}  # position: (final scores, best (move, rank) list)
+        self.max_entries = max_entries
+        self.nodes = 0
+        self.hits = 0
+        self.deadline = None
+
+    def solve(self, state, card_options=None, deadline=None):
+        """(final scores, every best (move, rank)) for the seat to play. card_options by seat are as Player's: 1
+        plays the highest card, 2 the highest or the lowest, 3 or more one card of each value. Past deadline (a
+        time.time()) it raises SearchTimeout, keeping the positions it finished in the memo"""
+        if card_options is None:
+            card_options = [1] * len(state.hands)
+        if len(self.memo) > self.max_entries:
+            self.memo.clear()
+        self.deadline = deadline
+        try:
+            return self.value(state, tuple(card_options))
+        finally:
+            self.deadline = None
+
+    def value(self, state, card_options):
+        key = (tuple(state.cells), tuple(state.hands), tuple(state.scores), state.p_turn, card_options)
+        out = self.memo.get(key)
+        if out is not None:
+            self.hits += 1
+            return out
+        seat = state.p_turn
+        hand = state.hands[seat]
+        if card_options[seat] > 2:
+            ranks = CHOICES[hand]
+        else:
+            ranks = [PICK[hand]]
+            if card_options[seat] > 1 and LOWEST[hand] != PICK[hand]:
+                ranks.append(LOWEST[hand])
+        last = sum(bin(h).count('1') for h in state.hands) == 1
+        best = None
+        best_utility = None
+        best_moves = []
+        for rank in ranks:
+            for move in state.moves():
+                self.nodes += 1
+                # Only look at the clock every 256 nodes, as AITreeSearch.check_time
+                if self.deadline is not None and not self.nodes % 256 and time.time() > self.deadline:
+                    raise SearchTimeout
+                if last:
+                    scores = self.final_scores(state, move, rank)
+                else:
+                    child = state.copy()
+                    child.play(move, rank)
+                    scores = tuple(child.scores) if child.gameover else self.value(child, card_options)[0]
+                u = utility(scores, seat)
+                if best is None or u > best_utility:
+                    best, best_utility, best_moves = scores, u, [(move, rank)]
+                elif u == best_utility:
+                    best_moves.append((move, rank))
+        out = self.memo[key] = (best, best_moves)
+        return out
+
+    @staticmethod
+    def final_scores(state, move, rank):
+        """Final scores if the last card is played at move, worked out from the cells it changes"""
+        lay = state.layout
+        cells = state.cells
+        card = BLANK + 1 + state.p_turn * len(RANKS) + rank
+        board_scores = state.board_scores[:]
+        if move < lay.n_cells:
+            changes = [(move, card, lay.weight[move])]
+        else:
+            changes = [(cell, card if source is None else cells[source], w)
+                       for cell, source, w in lay.line_scoring[move - lay.n_cells]]
+        for cell, new, w in changes:
+            old = cells[cell]
+            if lay.owner[old] >= 0:
+                board_scores[lay.owner[old]] -= w * lay.value[old]
+            if lay.owner[new] >= 0:
+                board_scores[lay.owner[new]] += w * lay.value[new]
+        return tuple(score + board_score for score, board_score in zip(state.scores, board_scores))
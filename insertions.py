@@ -0,0 +1,27 @@
+"""Edge insertion permutations, shared by curling.py and curling2 boards. Kept free of both engines so the legacy
+engine does not load curling2 to play a ply."""
+import operator
+
+_insertion_tables = {}
+
+
+def insertion_table(size):
+    """Edge insertions of a size board by (row, column) ply, as (line, pushed, gather). line is ('row' or 'column',
+    index), pushed the position along it of the card pushed off, and gather the fixed permutation of the insertion:
+    called on the line's cards with the new card appended, it returns the line's cards after the ply. Every card but
+    the central joker moves one cell on from the entry cell"""
+    table = _insertion_tables.get(size)
+    if table is None:
+        table = _insertion_tables[size] = {}
+        for i in range(size):
+            # Positions from the entry cell to the exit cell, skipping the joker
+            cells = [j for j in range(size) if i != size // 2 or j != size // 2]
+            for key, line, path in (((i + 1, 0), ('row', i), cells), ((i + 1, size + 1), ('row', i), cells[::-1]),
+                                    ((0, i + 1), ('column', i), cells),
+                                    ((size + 1, i + 1), ('column', i), cells[::-1])):
+                order = list(range(size))
+                order[path[0]] = size  # The new card
+                for j in range(1, len(path)):
+                    order[path[j]] = path[j - 1]
+                table[key] = (line, path[-1], operator.itemgetter(*order))
+    return table
@@ -0,0 +1,221 @@
+"""Opening book of setup plies for the standard game: three players on the default 5x5 board. The first plies of a
+game fill the 12 blanks, each seat playing its highest card, and the search would work out the same positions every
+game. The book holds the best plies found for them by a deeper search, built offline:
+
+    python openings.py --plies 4 --depth 3
+
+A position is keyed by the seat to play and the codes of the 12 blank cells, the rest of the board being the same
+through the setup. Codes are CompactBoard's, numbered by seat, on whichever image of the position under the 8 board
+symmetries (curling2.dihedral_maps) gives the least bytes. Its plies are stored on that image and mapped back on
+lookup. The file is a header, MAGIC, VERSION, board size, players, plies and search depth, then per position the seat
+to play, the number of plies, the 12 codes and the best plies as RANKS index and flat cell.
+
+With book=True, AITreeSearch (card_options 1) and curling.one_set_ai play from the book while their position is
+in it. It is off by default, so it changes no existing line-up's play."""
+import argparse
+import os
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor
+
+import curling2
+from curling2 import BLANK, RANKS
+
+MAGIC = b'CRLO'
+VERSION = 1
+SIZE = 5
+N_PLAYERS = 3
+SUITS = [chr(9829), chr(9830), chr(9827)]
+DEFAULT_EMPTY = [(0, 0), (0, 1), (0, 3), (0, 4), (1, 0), (1, 4), (3, 0), (3, 4), (4, 0), (4, 1), (4, 3), (4, 4)]
+BLANK_CELLS = [x * SIZE + y for x, y in DEFAULT_EMPTY]
+START = curling2.CompactBoard(SIZE).codes([])  # Codes of the board before the first ply
+FIXED_CELLS = [i for i in range(SIZE * SIZE) if i not in BLANK_CELLS]
+BOOK_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'openings.book')
+HEADER = struct.Struct('<4sBBBBBI')
+ENTRY = struct.Struct('<BB{}s'.format(len(BLANK_CELLS)))
+PLY = struct.Struct('<BB')
+
+_default = None
+
+
+def canonical(codes):
+    """(key, symmetry): the least blank cell codes of the images of the board's codes under the board symmetries, and
+    the index of the one giving it"""
+    maps = curling2.dihedral_maps(SIZE)
+    best = None
+    for t in range(len(maps)):
+        # The image has at cell i what codes has at the cell the inverse symmetry takes i to
+        cells = maps[curling2.INVERSE_SYMMETRY[t]][0]
+        image = bytes([codes[cells[i]] for i in BLANK_CELLS])
+        if best is None or image < best:
+            best, symmetry = image, t
+    # noinspection PyUnboundLocalVariable
+    return best, symmetry
+
+
+class OpeningBook:
+    def __init__(self, entries=None, plies=0, depth=0):
+        self.entries = entries if entries is not None else {}  # (canonical key, seat): [(rank, cell)] on its image
+        self.plies = plies  # plies from the start the book covers
+        self.depth = depth  # search depth it was built with
+
+    def __len__(self):
+        return len(self.entries)
+
+    def lookup(self, codes, p_turn):
+        """Best plies, as (rank, row, column), for the board of codes with seat p_turn to play, or None"""
+        if any(codes[i] != START[i] for i in FIXED_CELLS):
+            return None
+        key, symmetry = canonical(codes)
+        plies = self.entries.get((key, p_turn))
+        if plies is None:
+            return None
+        inverse = curling2.dihedral_maps(SIZE)[curling2.INVERSE_SYMMETRY[symmetry]][1]
+        return [(rank,) + inverse[cell // SIZE + 1, cell % SIZE + 1] for rank, cell in plies]
+
+    def dumps(self):
+        out = [HEADER.pack(MAGIC, VERSION, SIZE, N_PLAYERS, self.plies, self.depth, len(self.entries))]
+        for (key, p_turn), plies in sorted(self.entries.items()):
+            out.append(ENTRY.pack(p_turn, len(plies), key))
+            out.extend(PLY.pack(*ply) for ply in plies)
+        return b''.join(out)
+
+    @classmethod
+    def loads(cls, data):
+        magic, version, size, n_players, plies, depth, n = HEADER.unpack_from(data)
+        if magic != MAGIC:
+            raise Exception('Not an opening book')
+        if version > VERSION:
+            raise Exception('Opening book version {} is newer than {}'.format(version, VERSION))
+        if (size, n_players) != (SIZE, N_PLAYERS):
+            raise Exception('Opening book is for {} players on a size {} board'.format(n_players, size))
+        book = cls(plies=plies, depth=depth)
+        pos = HEADER.size
+        for _ in range(n):
+            p_turn, count, key = ENTRY.unpack_from(data, pos)
+            pos += ENTRY.size
+            book.entries[key, p_turn] = [PLY.unpack_from(data, pos + i * PLY.size) for i in range(count)]
+            pos += count * PLY.size
+        return book
+
+    def save(self, fname=BOOK_FILE):
+        with open(fname + '.tmp', 'wb') as f:
+            f.write(self.dumps())
+        os.replace(fname + '.tmp', fname)
+
+    @classmethod
+    def load(cls, fname=BOOK_FILE):
+        with open(fname, 'rb') as f:
+            return cls.loads(f.read())
+
+
+def default_book():
+    """The book in BOOK_FILE, loaded once, or an empty one if there is no file"""
+    global _default
+    if _default is None:
+        try:
+            _default = OpeningBook.load()
+        except FileNotFoundError:
+            _default = OpeningBook()
+    return _default
+
+
+def standard(n_players, size):
+    return n_players == N_PLAYERS and size == SIZE
+
+
+def game_ply(game, p_turn, book=None):
+    """(rank, row, column) from the book for a curling2 game, picked at random among equal plies, or None"""
+    if not standard(len(game.players), game.board.size) or not game.board.get_empty():
+        return None
+    book = book if book is not None else default_book()
+    plies = book.lookup(game.board.codes(game.players), p_turn)
+    return random.choice(plies) if plies else None
+
+
+def curling_ply(board, players, p_turn, book=None):
+    """(card in hand, row, column) from the book for a curling.py game, or None"""
+    import savefile
+    if not standard(len(players), board.size) or not board.get_empty():
+        return None
+    book = book if book is not None else default_book()
+    suits = [player.suit for player in players]
+    plies = book.lookup([savefile.curling_code(card, suits) for row in board.cards for card in row], p_turn)
+    if not plies:
+        return None
+    rank, row, column = random.choice(plies)
+    card = players[p_turn].in_hand(RANKS[rank])
+    return (card, row, column) if card else None
+
+
+# Building
+def setup_game(key, p_turn):
+    """curling2 game, not started, of standard players with the cards of key on the board and out of their hands"""
+    players = [curling2.Player('P{}'.format(i), suit) for i, suit in enumerate(SUITS)]
+    codes = START[:]
+    for i, code in zip(BLANK_CELLS, key):
+        codes[i] = code
+    for code in codes:
+        if code > BLANK:
+            slot, rank = divmod(code - BLANK - 1, len(RANKS))
+            players[slot].play(RANKS[rank])
+    board = curling2.CompactBoard.from_codes(SIZE, codes, DEFAULT_EMPTY, players)
+    return curling2.Game(curling2.GameState(board, players, [], p_turn, False), save=0, load=0, autostart=False)
+
+
+def positions(plies):
+    """(key, seat to play) of every position the first plies plies can reach, each seat playing its highest card"""
+    level = {(canonical(START)[0], 0)}
+    out = []
+    for _ in range(plies):
+        out.extend(sorted(level))
+        children = set()
+        for key, p_turn in level:
+            game = setup_game(key, p_turn)
+            card = game.players[p_turn].hand[0]
+            code = BLANK + 1 + p_turn * len(RANKS) + curling2.RANK_INDEX[card.name]
+            codes = game.board.codes(game.players)
+            for row, column in game.board.get_empty():
+                child = codes[:]
+                child[(row - 1) * SIZE + column - 1] = code
+                children.add((canonical(child)[0], (p_turn + 1) % N_PLAYERS))
+        level = children
+    return out
+
+
+def best_plies(key, p_turn, depth):
+    """Every ply of the mover's highest card equal best by a max^n search of depth, as (rank, cell). Plies a
+    symmetry of the position takes onto a kept one are left out"""
+    curling2.PRINT = False
+    random.seed(key + bytes([p_turn]))
+    game = setup_game(key, p_turn)
+    searcher = curling2.AITreeSearch('book', '', depth, book=False)
+    alter_scores = {player: 0 for player in game.players}
+    scored = searcher.score_plies(game, depth, p_turn, alter_scores, searcher.root_plies(game, p_turn))
+    best = max(value for _, value in scored)
+    return [(curling2.RANK_INDEX[ply.card.name], (ply.row - 1) * SIZE + ply.column - 1)
+            for ply, value in scored if value == best]
+
+
+def build(plies=4, depth=3, workers=None):
+    """Book of the positions before each of the first plies plies"""
+    keys = positions(plies)
+    book = OpeningBook(plies=plies, depth=depth)
+    with ProcessPoolExecutor(workers) as pool:
+        results = pool.map(best_plies, [key for key, _ in keys], [p_turn for _, p_turn in keys],
+                           [depth] * len(keys), chunksize=8)
+        for key, found in zip(keys, results):
+            book.entries[key] = found
+    return book
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Builds the setup phase opening book')
+    parser.add_argument('--plies', type=int, default=4, help='plies from the start to cover')
+    parser.add_argument('--depth', type=int, default=3, help='search depth of each position')
+    parser.add_argument('--workers', type=int, default=None, help='processes to search in')
+    parser.add_argument('--out', default=BOOK_FILE, help='book file to write')
+    args = parser.parse_args()
+    result = build(args.plies, args.depth, args.workers)
+    result.save(args.out)
+    print('{} positions, {} bytes, written to {}'.format(len(result), len(result.dumps()), args.out))
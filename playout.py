@@ -0,0 +1,318 @@
+"""Fast playouts for simulation: whole games played on a flat list of CompactBoard card codes, hands as 13 bit masks
+and a score per seat, with no Card, Player or Ply objects. Moves are ints: a cell index (row * size + column) to
+place on an empty cell during setup, or size * size plus the index of an edge insertion in Player.enum_plies order.
+
+Policies, one for every seat or a list with one per seat:
+
+    'random'        a random legal move
+    'r1', 'r2'      random moves kept to rows and columns 1-3 or 2-4, as AIPlayer's gm
+    'greedy'        the move that most raises the player's board score over everyone else's, as curling.one_set_ai
+
+Every player plays their highest card, as all the AI players do.
+
+    python playout.py
+
+compares games per second against self-play through curling.main."""
+import random
+import time
+
+import curling2
+from curling2 import BLANK, RANKS, RANK_VALUES
+
+POLICIES = ('random', 'r1', 'r2', 'greedy')
+# Ranks in the order players pick their cards: highest value first, as Player.hand is sorted
+PICK_ORDER = sorted(range(len(RANKS)), key=lambda i: (-RANK_VALUES[i], i))
+# Rank played from every hand mask, -1 for an empty hand, and the lowest rank for players with two card options
+PICK = [next((rank for rank in PICK_ORDER if mask >> rank & 1), -1) for mask in range(1 << len(RANKS))]
+LOWEST = [next((rank for rank in PICK_ORDER[::-1] if mask >> rank & 1), -1) for mask in range(1 << len(RANKS))]
+
+
+def _choices(mask):
+    out = []
+    for rank in PICK_ORDER:
+        if mask >> rank & 1 and (not out or RANK_VALUES[rank] != RANK_VALUES[out[-1]]):
+            out.append(rank)
+    return out
+
+
+# Ranks a player with every card as an option chooses from, for every hand mask: the first in pick order of each value
+CHOICES = [_choices(mask) for mask in range(1 << len(RANKS))]
+
+_layouts = {}
+
+
+class Layout:
+    """Tables for a board size and number of players, shared by every PlayoutState using them"""
+    def __init__(self, size, n_players):
+        self.size = size
+        self.n_cells = size * size
+        joker_pos = size // 2
+        joker_cell = joker_pos * size + joker_pos
+        self.weight = [0] * self.n_cells
+        for x, y in ((joker_pos - 1, joker_pos - 1), (joker_pos - 1, joker_pos + 1),
+                     (joker_pos + 1, joker_pos - 1), (joker_pos + 1, joker_pos + 1)):
+            self.weight[x * size + y] = 1
+        for x, y in ((joker_pos - 1, joker_pos), (joker_pos, joker_pos - 1),
+                     (joker_pos + 1, joker_pos), (joker_pos, joker_pos + 1)):
+            self.weight[x * size + y] = 2
+        # Edge insertions in Player.enum_plies order, each the cells from entry to exit skipping the joker
+        self.line_plies = [(0, i) for i in range(1, size + 1)] + [(size + 1, i) for i in range(1, size + 1)] + \
+                          [(i, 0) for i in range(1, size + 1)] + [(i, size + 1) for i in range(1, size + 1)]
+        self.lines = []
+        for row, column in self.line_plies:
+            if column in (0, size + 1):
+                line = [(row - 1) * size + c for c in range(size)]
+            else:
+                line = [r * size + column - 1 for r in range(size)]
+            line = [i for i in line if i != joker_cell]
+            if row == size + 1 or column == size + 1:
+                line.reverse()
+            self.lines.append(line)
+        # (cell, cell the card moves from, weight) for the scoring cells of each line, None for the entry cell
+        self.line_scoring = [[(cell, line[k - 1] if k else None, self.weight[cell])
+                              for k, cell in enumerate(line) if self.weight[cell]] for line in self.lines]
+        # Per code: owning seat (-1 for none) and value, and per seat the value counted for or against the seat
+        n_codes = BLANK + 1 + n_players * len(RANKS)
+        self.owner = [-1] * (BLANK + 1) + [seat for seat in range(n_players) for _ in RANKS]
+        self.value = [0] * (BLANK + 1) + RANK_VALUES * n_players
+        self.relative = [[self.value[code] if self.owner[code] == seat else -self.value[code]
+                          for code in range(n_codes)] for seat in range(n_players)]
+        # Cells and edge insertions gm 'r1' and 'r2' keep to
+        self.restricted = {}
+        for gm, low, high in (('r1', 1, 3), ('r2', 2, 4)):
+            self.restricted[gm] = (low, high, [i for i, (r, c) in enumerate(self.line_plies)
+                                               if low <= r <= high or low <= c <= high])
+
+
+def layout(size, n_players):
+    out = _layouts.get((size, n_players))
+    if out is None:
+        out = _layouts[size, n_players] = Layout(size, n_players)
+    return out
+
+
+class PlayoutState:
+    """A position to play out. play and playout change it in place, so copy() one to play it out again"""
+    __slots__ = ('layout', 'cells', 'hands', 'scores', 'board_scores', 'p_turn', 'blanks', 'gameover')
+
+    def __init__(self, size, cells, hands, scores, p_turn, gameover=False):
+        self.layout = layout(size, len(hands))
+        self.cells = list(cells)
+        self.hands = list(hands)
+        self.scores = list(scores)
+        self.p_turn = p_turn
+        self.blanks = [i for i, code in enumerate(self.cells) if code == BLANK]
+        self.gameover = gameover
+        self.board_scores = [0] * len(hands)
+        for i, code in enumerate(self.cells):
+            if self.layout.owner[code] >= 0:
+                self.board_scores[self.layout.owner[code]] += self.layout.weight[i] * self.layout.value[code]
+
+    @classmethod
+    def start(cls, n_players=3, size=5, empty='Default'):
+        """The position before the first ply"""
+        board = curling2.CompactBoard(size, empty)
+        return cls(size, board.codes([]), [(1 << len(RANKS)) - 1] * n_players, [0] * n_players, 0)
+
+    @classmethod
+    def from_game(cls, game, p_turn=None, alter_scores=None):
+        """Position of a curling2 Game, with p_turn and the scores as in a search when given"""
+        players = game.players
+        hands = []
+        for player in players:
+            mask = 0
+            for card in player.hand:
+                mask |= 1 << curling2.RANK_INDEX[card.name]
+            hands.append(mask)
+        scores = [p.score + (alter_scores[p] if alter_scores else 0) for p in players]
+        return cls(game.board.size, game.board.codes(players), hands, scores,
+                   game.p_turn if p_turn is None else p_turn, bool(game.gameover))
+
+    @classmethod
+    def from_curling(cls, board, players, p_turn):
+        """Position of a curling.py game"""
+        import savefile
+        suits = [player.suit for player in players]
+        cells = [savefile.curling_code(card, suits) for row in board.cards for card in row]
+        return cls(board.size, cells, [savefile.hand_mask(player.hand) for player in players],
+                   [player.score for player in players], p_turn, bool(board.final))
+
+    def copy(self):
+        out = PlayoutState.__new__(PlayoutState)
+        out.layout = self.layout
+        out.cells = self.cells[:]
+        out.hands = self.hands[:]
+        out.scores = self.scores[:]
+        out.board_scores = self.board_scores[:]
+        out.p_turn = self.p_turn
+        out.blanks = self.blanks[:]
+        out.gameover = self.gameover
+        return out
+
+    def card(self, seat):
+        """Code of the card seat plays next, their highest"""
+        rank = PICK[self.hands[seat]]
+        if rank < 0:
+            raise Exception('Seat {} has no cards'.format(seat))
+        return BLANK + 1 + seat * len(RANKS) + rank
+
+    def ply(self, move):
+        """(row, column) of a move, as in a Ply"""
+        if move < self.layout.n_cells:
+            row, column = divmod(move, self.layout.size)
+            return row + 1, column + 1
+        return self.layout.line_plies[move - self.layout.n_cells]
+
+    def move(self, row, column):
+        """Move for a ply at row, column"""
+        if self.blanks:
+            return (row - 1) * self.layout.size + column - 1
+        return self.layout.n_cells + self.layout.line_plies.index((row, column))
+
+    def moves(self):
+        """Every legal move"""
+        if self.blanks:
+            return self.blanks[:]
+        return list(range(self.layout.n_cells, self.layout.n_cells + len(self.layout.lines)))
+
+    def play(self, move, rank=None):
+        """Plays the card of rank, by default the highest, of the seat to play at move"""
+        lay = self.layout
+        cells = self.cells
+        seat = self.p_turn
+        card = self.card(seat) if rank is None else BLANK + 1 + seat * len(RANKS) + rank
+        if move < lay.n_cells:
+            self.blanks.remove(move)
+            cells[move] = card
+            self.board_scores[seat] += lay.weight[move] * lay.value[card]
+        else:
+            j = move - lay.n_cells
+            owner = lay.owner
+            value = lay.value
+            board_scores = self.board_scores
+            scoring = lay.line_scoring[j]
+            for cell, _, w in scoring:
+                if owner[cells[cell]] >= 0:
+                    board_scores[owner[cells[cell]]] -= w * value[cells[cell]]
+            line = lay.lines[j]
+            for k in range(len(line) - 1, 0, -1):
+                cells[line[k]] = cells[line[k - 1]]
+            cells[line[0]] = card
+            for cell, _, w in scoring:
+                if owner[cells[cell]] >= 0:
+                    board_scores[owner[cells[cell]]] += w * value[cells[cell]]
+        self.hands[seat] &= ~(1 << (card - BLANK - 1) % len(RANKS))
+        self.p_turn = (seat + 1) % len(self.hands)
+        if not self.hands[self.p_turn]:
+            self.gameover = True
+            for s, board_score in enumerate(self.board_scores):
+                self.scores[s] += board_score
+        else:
+            self.scores[self.p_turn] += self.board_scores[self.p_turn]
+
+    def choose(self, policy, rng=random):
+        """Move for the seat to play under policy"""
+        lay = self.layout
+        if policy == 'random':
+            if self.blanks:
+                return self.blanks[int(rng.random() * len(self.blanks))]
+            return lay.n_cells + int(rng.random() * len(lay.lines))
+        elif policy == 'greedy':
+            return self.greedy(rng)
+        elif policy in lay.restricted:
+            return self.restricted(policy, rng)
+        raise Exception('Unknown playout policy {}, choose from {}'.format(policy, POLICIES))
+
+    def greedy(self, rng=random):
+        """As curling.one_set_ai: the move leaving the player's board score furthest over everyone else's, 2 * own -
+        total, if that is above 0, and the first move otherwise. At 0 the first move is drawn along with the moves
+        tied at 0, twice if it is one of them"""
+        seat = self.p_turn
+        lay = self.layout
+        cells = self.cells
+        card = self.card(seat)
+        lead = 2 * self.board_scores[seat] - sum(self.board_scores)
+        best_score = 0
+        ties = 1
+        if self.blanks:
+            best = self.blanks[0]
+            for cell in self.blanks:
+                score = lead + lay.weight[cell] * lay.value[card]
+                if score > best_score:
+                    best, best_score, ties = cell, score, 1
+                elif score == best_score:
+                    ties += 1
+                    if rng.randrange(ties) == 0:
+                        best = cell
+            return best
+        relative = lay.relative[seat]
+        new_card = relative[card]
+        best = 0
+        for j, scoring in enumerate(lay.line_scoring):
+            score = lead
+            for cell, source, w in scoring:
+                score += w * ((new_card if source is None else relative[cells[source]]) - relative[cells[cell]])
+            if score > best_score:
+                best, best_score, ties = j, score, 1
+            elif score == best_score:
+                ties += 1
+                if rng.randrange(ties) == 0:
+                    best = j
+        return lay.n_cells + best
+
+    def restricted(self, gm, rng=random):
+        """As AIPlayer.make_move with gm 'r1' or 'r2'"""
+        lay = self.layout
+        low, high, lines = lay.restricted[gm]
+        size = lay.size
+        if self.blanks:
+            inner = [i for i in self.blanks if low <= i // size + 1 <= high and low <= i % size + 1 <= high]
+            if inner:
+                return inner[rng.randrange(len(inner))]
+            rows = [i for i in self.blanks if low <= i // size + 1 <= high]
+            columns = [i for i in self.blanks if low <= i % size + 1 <= high]
+            insert_row = rng.random() < 0.5
+            if rows and (insert_row or not columns):
+                return rows[rng.randrange(len(rows))]
+            elif columns:
+                return columns[rng.randrange(len(columns))]
+            return self.blanks[rng.randrange(len(self.blanks))]
+        return lay.n_cells + lines[rng.randrange(len(lines))]
+
+    def playout(self, policy='random', rng=random):
+        """Plays the game out, policy being one for every seat or a list by seat. Returns the final scores"""
+        policies = [policy] * len(self.hands) if isinstance(policy, str) else policy
+        while not self.gameover:
+            self.play(self.choose(policies[self.p_turn], rng))
+        return self.scores
+
+
+def selfplay(games, policy=('greedy', 'greedy', 'greedy'), seed=0):
+    """Wins and mean scores by seat of games played out from the start, as curling.averages"""
+    rng = random.Random(seed)
+    start = PlayoutState.start(len(policy))
+    wins = [0] * len(policy)
+    totals = [0] * len(policy)
+    for _ in range(games):
+        scores = start.copy().playout(list(policy), rng)
+        best = max(scores)
+        for seat, score in enumerate(scores):
+            totals[seat] += score
+            wins[seat] += score == best
+    return wins, [total / games for total in totals]
+
+
+if __name__ == '__main__':
+    import curling
+    for policy, gm in (('random', 'r'), ('greedy', '')):
+        curling.PRINT = False
+        random.seed(0)
+        t = time.time()
+        for _ in range(20):
+            curling.main((1, 1, 1), (gm,) * 3)
+        slow = 20 / (time.time() - t)
+        t = time.time()
+        wins, means = selfplay(2000, (policy,) * 3)
+        fast = 2000 / (time.time() - t)
+        print('{}: curling.main {:.0f} games/s, playout {:.0f} games/s ({:.0f}x), mean scores {}'.format(
+            policy, slow, fast, fast / slow, ['{:.1f}'.format(m) for m in means]))
@@ -0,0 +1,336 @@
+"""Compact binary save files for both engines, replacing pickles of the live objects. A file is a header, MAGIC and
+the VERSION and engine bytes, then the game:
+
+    curling.py    final flag, size, turn, board codes, discarded codes, players (name, suit, score, hand, ai, gm)
+    curling2.py   flags, size, turn, journal record number, board codes, empty cells, players (kind and settings,
+                  name, suit, score, hand), ply history
+
+Cards are the CompactBoard codes with owners numbered by seat, and hands are 13 bit masks over RANKS. Loading only
+builds objects from numbers and strings, so a file cannot run code the way a pickle can.
+
+    python savefile.py game.pi ...
+
+converts pickle saves of either engine in place. curling.load and Game.load only read binary files: a pickle can run
+code as it loads, so one is only read by converting it, for a file known to be safe."""
+import io
+import os
+import pickle
+import struct
+import sys
+
+import curling
+import curling2
+from curling2 import BLANK, FILLER, JOKER, RANK_INDEX, RANKS
+
+MAGIC = b'CRLG'
+VERSION = 2  # 2 added AIMCTSPlayer and AITreeSearch's endgame, symmetry, book, ordering and batch options
+CURLING, CURLING2 = 1, 2
+NO_CARD = 255
+PLAYER_KINDS = ['Player', 'HumanPlayer', 'AIPlayer', 'AIGreedyPlayer', 'AITreeSearch', 'AIMCTSPlayer']
+
+
+class Writer:
+    def __init__(self):
+        self.out = io.BytesIO()
+
+    def pack(self, fmt, *values):
+        self.out.write(struct.pack('<' + fmt, *values))
+
+    def string(self, s):
+        data = s.encode()
+        self.pack('H', len(data))
+        self.out.write(data)
+
+    def codes(self, codes):
+        self.pack('H', len(codes))
+        self.out.write(bytes(codes))
+
+    def getvalue(self):
+        return self.out.getvalue()
+
+
+class Reader:
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def unpack(self, fmt):
+        fmt = '<' + fmt
+        values = struct.unpack_from(fmt, self.data, self.pos)
+        self.pos += struct.calcsize(fmt)
+        return values if len(values) > 1 else values[0]
+
+    def string(self):
+        n = self.unpack('H')
+        self.pos += n
+        return self.data[self.pos - n:self.pos].decode()
+
+    def codes(self):
+        n = self.unpack('H')
+        self.pos += n
+        return list(self.data[self.pos - n:self.pos])
+
+
+def is_binary(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def check_binary(data, fname):
+    if not is_binary(data):
+        raise Exception('{} is not a binary save file. A pickle save from a trusted source can be converted with: '
+                        'python savefile.py {}'.format(fname, fname))
+
+
+def header(data, engine):
+    """Reader positioned after the header, checking it is an engine file this version can read"""
+    if not is_binary(data):
+        raise Exception('Not a binary save file')
+    reader = Reader(data)
+    reader.pos = len(MAGIC)
+    version, file_engine = reader.unpack('BB')
+    if version > VERSION:
+        raise Exception('Save file version {} is newer than {}'.format(version, VERSION))
+    if file_engine != engine:
+        raise Exception('Save file is for engine {}, not {}'.format(file_engine, engine))
+    reader.version = version
+    return reader
+
+
+def hand_mask(hand):
+    mask = 0
+    for card in hand:
+        mask |= 1 << RANK_INDEX[card.name]
+    return mask
+
+
+def card_name(rank):
+    """Name to create a Card of rank by, as Card('0') would have no value"""
+    return '10' if RANKS[rank] == '0' else RANKS[rank]
+
+
+# curling.py: cards are told apart by suit, and an empty cell is ''
+def curling_code(card, suits):
+    if card == '':
+        return BLANK
+    elif isinstance(card, curling.Joker):
+        return JOKER
+    elif card.suit not in suits:
+        return FILLER
+    return BLANK + 1 + suits.index(card.suit) * len(RANKS) + RANK_INDEX[card.name]
+
+
+def curling_card(code, players, board):
+    if code == BLANK:
+        return ''
+    elif code == JOKER:
+        return board.joker
+    elif code == FILLER:
+        return curling.Card('*', '*')
+    slot, rank = divmod(code - BLANK - 1, len(RANKS))
+    card = curling.Card(card_name(rank), players[slot].suit)
+    card.played = True
+    return card
+
+
+def dumps_curling(board, players, discarded, p_turn, statement=None):
+    """Encodes the curling.py game tuple. The statement is not stored, being rebuilt from the rest"""
+    suits = [player.suit for player in players]
+    w = Writer()
+    w.out.write(MAGIC)
+    w.pack('BB', VERSION, CURLING)
+    w.pack('BBBB', board.final, board.size, p_turn, len(players))
+    w.codes([curling_code(card, suits) for row in board.cards for card in row])
+    w.codes([curling_code(card, suits) for card in discarded])
+    for player in players:
+        w.string(player.name)
+        w.string(player.suit)
+        w.pack('iHB', player.score, hand_mask(player.hand), bool(player.ai))
+        w.string(player.gm or '')
+    return w.getvalue()
+
+
+def loads_curling(data):
+    """The (board, players, discarded, p_turn, statement) tuple curling.load returns"""
+    r = header(data, CURLING)
+    final, size, p_turn, n_players = r.unpack('BBBB')
+    codes = r.codes()
+    discard_codes = r.codes()
+    players = []
+    for _ in range(n_players):
+        name = r.string()
+        suit = r.string()
+        score, mask, ai = r.unpack('iHB')
+        player = curling.Player(name, suit, ai=bool(ai), gm=r.string())
+        player.score = score
+        for card in player.hand:
+            card.played = not mask & 1 << RANK_INDEX[card.name]
+        player.hand = [card for card in player.hand if not card.played]
+        players.append(player)
+
+    board = curling.Board(size, empty=[])
+    board._cards = [[curling_card(code, players, board) for code in codes[r * size:(r + 1) * size]]
+                    for r in range(size)]
+    discarded = [curling_card(code, players, board) for code in discard_codes]
+    for card in discarded:
+        card.discarded = True
+    if final:
+        board.finalise()
+        statement = "Final score:\n" + '\n'.join('{}: {}'.format(player, player.score) for player in players) + \
+                    "\n{} Wins!".format(max((p for p in players), key=lambda x: x.score).name)
+    else:
+        statement = curling.statement_and_score(board, players[p_turn])[0]
+    return board, players, discarded, p_turn, statement
+
+
+# curling2.py
+def write_player(w, player):
+    kind = type(player).__name__
+    w.pack('B', PLAYER_KINDS.index(kind) if kind in PLAYER_KINDS else 0)
+    w.string(player.name)
+    w.string(player.suit)
+    w.pack('iHBB', player.score, hand_mask(player.hand), player.card_options, player.AI)
+    if kind == 'AIPlayer':
+        w.string(player.gm or '')
+    elif kind == 'AITreeSearch':
+        w.pack('BBIdBB', player.depth, curling2.SEARCH_MODES.index(player.mode),
+               player.table.size if player.table is not None else 0,
+               player.time_budget if player.time_budget is not None else -1, player.workers or 0,
+               player.game_stats is not None)
+        w.pack('BBBBB', player.endgame_plies, player.symmetry, player.book, player.ordering, player.batch)
+    elif kind == 'AIMCTSPlayer':
+        import playout
+        w.pack('IdBddB', player.iterations, player.time_limit if player.time_limit is not None else -1,
+               playout.POLICIES.index(player.policy), player.exploration, player.score_weight, player.reuse)
+
+
+def read_player(r):
+    kind = PLAYER_KINDS[r.unpack('B')]
+    name = r.string()
+    suit = r.string()
+    score, mask, card_options, ai = r.unpack('iHBB')
+    if kind == 'AIPlayer':
+        player = curling2.AIPlayer(name, suit, gm=r.string())
+    elif kind == 'AITreeSearch':
+        depth, mode, table_size, time_budget, workers, stats = r.unpack('BBIdBB')
+        player = curling2.AITreeSearch(name, suit, depth, card_options, curling2.SEARCH_MODES[mode], table_size,
+                                       time_budget if time_budget >= 0 else None, workers or None, bool(stats))
+        if r.version >= 2:
+            endgame_plies, symmetry, book, ordering, batch = r.unpack('BBBBB')
+            player.endgame_plies = endgame_plies
+            player.symmetry = bool(symmetry)
+            player.book = bool(book)
+            player.ordering = bool(ordering)
+            player.batch = bool(batch)
+    elif kind == 'AIMCTSPlayer':
+        import playout
+        iterations, time_limit, policy, exploration, score_weight, reuse = r.unpack('IdBddB')
+        player = curling2.AIMCTSPlayer(name, suit, iterations, time_limit if time_limit >= 0 else None,
+                                       playout.POLICIES[policy], exploration, score_weight, card_options, bool(reuse))
+    else:
+        player = getattr(curling2, kind)(name, suit)
+    player.card_options = card_options
+    player.AI = bool(ai)
+    player.score = score
+    for card in [c for c in player.hand if not mask & 1 << RANK_INDEX[c.name]]:
+        player.play(card)
+    return player
+
+
+def dumps_game_state(game_state, journal_seq=0):
+    """Encodes a curling2 GameState, and the number of the last journal record it includes"""
+    board = game_state.board
+    players = game_state.players
+    w = Writer()
+    w.out.write(MAGIC)
+    w.pack('BB', VERSION, CURLING2)
+    flags = bool(game_state.gameover) | bool(board._final) << 1 | isinstance(board, curling2.CompactBoard) << 2
+    w.pack('BBBBI', flags, board.size, game_state.p_turn, len(players), journal_seq)
+    w.codes(board.codes(players))
+    w.codes([(r - 1) * board.size + c - 1 for r, c in board.get_empty()])
+    for player in players:
+        write_player(w, player)
+    w.pack('H', len(game_state.plyhistory))
+    for ply, discard in game_state.plyhistory:
+        if not (0 <= ply.row <= 255 and 0 <= ply.column <= 255):
+            raise Exception('Ply {} is off the board and cannot be saved'.format(ply))
+        w.pack('BBBB', curling2.card_code(ply.card, players), ply.row, ply.column,
+               curling2.card_code(discard, players) if isinstance(discard, curling2.Card) else NO_CARD)
+    return w.getvalue()
+
+
+def loads_game_state(data):
+    """(GameState, journal record number) from dumps_game_state"""
+    r = header(data, CURLING2)
+    flags, size, p_turn, n_players, journal_seq = r.unpack('BBBBI')
+    codes = r.codes()
+    empty = [divmod(i, size) for i in r.codes()]
+    players = [read_player(r) for _ in range(n_players)]
+    if flags & 4:
+        board = curling2.CompactBoard.from_codes(size, codes, empty, players)
+    else:
+        board = curling2.Board(size, empty=empty)
+        cells = []
+        for i, code in enumerate(codes):
+            if code == BLANK:
+                cells.append(board.card_at(*divmod(i, size)))
+            elif code == JOKER:
+                cells.append(board.joker)
+            elif code == FILLER:
+                cells.append(curling2.FILLER_CARD)
+            else:
+                card = curling2.code_card(code, players)
+                card.played = True
+                cells.append(card)
+        board.cards = [cells[r * size:(r + 1) * size] for r in range(size)]
+    if flags & 2:
+        board.finalise()
+
+    plyhistory = []
+    for _ in range(r.unpack('H')):
+        code, row, column, discard = r.unpack('BBBB')
+        if discard == NO_CARD:
+            discard = ''
+        elif discard == BLANK:
+            discard = curling2.BlankCard((row, column))  # Only a setup ply, placed on the blank's cell, discards one
+        elif discard == FILLER:
+            discard = curling2.FILLER_CARD
+        else:
+            discard = curling2.code_card(discard, players)
+        plyhistory.append((curling2.Ply(curling2.code_card(code, players), row, column), discard))
+    game_state = curling2.GameState(board, players, plyhistory, p_turn, bool(flags & 1))
+    return game_state, journal_seq
+
+
+def load_pickles(data):
+    """Every object pickled one after another in data"""
+    f = io.BytesIO(data)
+    out = []
+    while True:
+        try:
+            out.append(pickle.load(f))
+        except EOFError:
+            return out
+
+
+def convert(fname, out=None):
+    """Rewrites a pickle save of either engine in the binary format, to out or in place. Returns False if fname is
+    already binary"""
+    with open(fname, 'rb') as f:
+        data = f.read()
+    if is_binary(data):
+        return False
+    objects = load_pickles(data)
+    if isinstance(objects[0], curling2.GameState):
+        binary = dumps_game_state(objects[0], objects[1] if len(objects) > 1 else 0)
+    else:
+        binary = dumps_curling(*objects)
+    out = out or fname
+    with open(out + '.tmp', 'wb') as f:
+        f.write(binary)
+    os.replace(out + '.tmp', out)
+    return True
+
+
+if __name__ == '__main__':
+    for path in sys.argv[1:]:
+        print(path, 'converted' if convert(path) else 'already binary')
@@ -0,0 +1,235 @@
+"""asyncio service hosting many curling2 games. Human plies come in as requests, AI plies run in a worker pool so the
+event loop keeps serving other games, and every ply is pushed to the game's subscribers as a state update.
+
+Each game has a latency budget: the seconds a round of AI plies may take once a human has played. It is shared
+between the AI plies as in Game.online_turn, and searching players stop at their share through timed_move.
+
+    async with GameServer() as server:
+        game_id = server.new_game(players)
+        client = LocalClient(server, game_id)
+        await client.play('K', 1, 2)
+        state = await client.wait_for_turn()
+"""
+import asyncio
+import itertools
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import curling2
+
+log = logging.getLogger(__name__)
+
+
+class GameSession:
+    """A hosted game, the lock held while a ply is being made and the queues its updates go to"""
+    def __init__(self, game_id, game, time_budget):
+        self.game_id = game_id
+        self.game = game
+        self.time_budget = time_budget
+        self.lock = asyncio.Lock()
+        self.subscribers = []
+        self.ai_task = None
+        self.plies = 0
+
+
+class GameServer:
+    def __init__(self, executor=None, time_budget=5, workers=None):
+        # AI players search the live board, so a game's plies run one at a time under its lock. Threads let the
+        # search share the players' objects, e.g. AITreeSearch's transposition table
+        self.executor = executor if executor is not None else ThreadPoolExecutor(workers)
+        self.time_budget = time_budget
+        self.sessions = {}
+        self._ids = itertools.count(1)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def new_game(self, players, board=None, time_budget=None, game_id=None):
+        """Hosts a new game between players, which must not be in another game. AI players to start move at once.
+        Returns the game id"""
+        if game_id is None:
+            game_id = next(self._ids)
+        if game_id in self.sessions:
+            raise Exception('Game {} already exists'.format(game_id))
+        curling2.PRINT = False
+        board = board if board is not None else curling2.CompactBoard()
+        game = curling2.Game(curling2.StartGameState(board, players), save=0, load=0, autostart=False)
+        session = self.sessions[game_id] = GameSession(game_id, game, time_budget or self.time_budget)
+        self.start_ai_turns(session)
+        return game_id
+
+    def session(self, game_id):
+        session = self.sessions.get(game_id)
+        if session is None:
+            raise Exception('No game {}'.format(game_id))
+        return session
+
+    def subscribe(self, game_id):
+        """Queue that receives a state update after every ply of the game"""
+        queue = asyncio.Queue()
+        self.session(game_id).subscribers.append(queue)
+        return queue
+
+    def unsubscribe(self, game_id, queue):
+        self.session(game_id).subscribers.remove(queue)
+
+    async def state(self, game_id):
+        session = self.session(game_id)
+        async with session.lock:
+            return self.describe(session)
+
+    @staticmethod
+    def describe(session, last_ply=None):
+        game = session.game
+        state = game.get_game_state()
+        return {'game': session.game_id, 'ply': session.plies, 'last_ply': str(last_ply) if last_ply else None,
+                'board': str(game.board), 'scores': {str(player): player.score for player in game.players},
+                'p_turn': game.p_turn, 'next_player': game.players[game.p_turn].name, 'gameover': game.gameover,
+                'human_turn': not game.gameover and not game.players[game.p_turn].AI,
+                'statement': state.statement()}
+
+    def publish(self, session, last_ply):
+        state = self.describe(session, last_ply)
+        for queue in session.subscribers:
+            queue.put_nowait(state)
+        return state
+
+    async def play(self, game_id, card, row, column):
+        """Plays a human ply. Returns 'Done' or the error, as Game.make_move. The AI plies that follow run in the
+        background and are pushed to subscribers"""
+        session = self.session(game_id)
+        async with session.lock:
+            game = session.game
+            player = game.players[game.p_turn]
+            if game.gameover:
+                return 'Game over'
+            if player.AI:
+                return 'Not your turn'
+            card = player.in_hand(card)
+            if not card:
+                return 'Please pick card again'
+            ply = curling2.Ply(card, row, column)
+            error = game.make_move(ply)
+            if error != 'Done':
+                return error
+            session.plies += 1
+            self.publish(session, ply)
+        self.start_ai_turns(session)
+        return error
+
+    def start_ai_turns(self, session):
+        game = session.game
+        if not game.gameover and game.players[game.p_turn].AI and (session.ai_task is None or session.ai_task.done()):
+            session.ai_task = asyncio.get_running_loop().create_task(self.ai_turns(session))
+            session.ai_task.add_done_callback(self.ai_turns_done)
+
+    @staticmethod
+    def ai_turns_done(task):
+        """Logs the error of AI turns that failed, as nothing may await them"""
+        if not task.cancelled() and task.exception() is not None:
+            log.error('AI turns failed', exc_info=task.exception())
+
+    async def ai_turns(self, session):
+        """Plays AI plies until a human is next, each in the executor with an equal share of what is left of the
+        game's budget"""
+        loop = asyncio.get_running_loop()
+        deadline = time.time() + session.time_budget
+        async with session.lock:
+            game = session.game
+            try:
+                while not game.gameover and game.players[game.p_turn].AI:
+                    player = game.players[game.p_turn]
+                    share = max(deadline - time.time(), 0) / game.ai_turns_ahead()
+                    ply = await loop.run_in_executor(self.executor, player.timed_move, game.get_game_state(), share,
+                                                     False)
+                    game.make_move(ply)
+                    session.plies += 1
+                    self.publish(session, ply)
+            except Exception as e:
+                for queue in session.subscribers:
+                    queue.put_nowait({'game': session.game_id, 'error': '{}: {}'.format(type(e).__name__, e)})
+                raise
+
+    async def wait_idle(self, game_id):
+        """Waits for the game's AI plies in progress"""
+        task = self.session(game_id).ai_task
+        if task is not None:
+            await task
+
+    async def end_game(self, game_id):
+        """Stops hosting the game once its AI plies in progress are done. A failure of theirs has been logged and
+        sent to the subscribers, so it is not raised again"""
+        session = self.sessions.pop(game_id)
+        if session.ai_task is not None:
+            await asyncio.gather(session.ai_task, return_exceptions=True)
+
+    async def close(self):
+        for game_id in list(self.sessions):
+            await self.end_game(game_id)
+        self.executor.shutdown()
+
+
+class LocalClient:
+    """In-process client of one game, for tests and local play"""
+    def __init__(self, server, game_id):
+        self.server = server
+        self.game_id = game_id
+        self.updates = server.subscribe(game_id)
+
+    async def play(self, card, row, column):
+        return await self.server.play(self.game_id, card, row, column)
+
+    async def state(self):
+        return await self.server.state(self.game_id)
+
+    async def next_update(self, timeout=None):
+        return await asyncio.wait_for(self.updates.get(), timeout)
+
+    async def wait_for_turn(self, timeout=None):
+        """Latest state once a human is to play or the game is over"""
+        state = await self.state()
+        while 'error' in state or not (state['human_turn'] or state['gameover']):
+            state = await self.next_update(timeout)
+            if 'error' in state:
+                raise Exception('AI turn failed in game {}: {}'.format(self.game_id, state['error']))
+        while not self.updates.empty():
+            state = self.updates.get_nowait()
+        return state
+
+    def close(self):
+        self.server.unsubscribe(self.game_id, self.updates)
+
+
+async def demo(games=4, time_budget=1):
+    """Plays games at once, each a human seat (playing its first legal ply) against two tree searches, reporting how
+    long each human waited for the AI replies"""
+    async def play_one(server, i):
+        players = [curling2.Player('Human {}'.format(i), chr(9829)),
+                   curling2.AITreeSearch('Tree', chr(9830), 2),
+                   curling2.AITreeSearch('Tree', chr(9827), 2)]
+        game_id = server.new_game(players)
+        client = LocalClient(server, game_id)
+        waits = []
+        state = await client.wait_for_turn()
+        while not state['gameover']:
+            game = server.session(game_id).game
+            ply = next(curling2.Player.enum_plies(game, game.p_turn))
+            t = time.time()
+            await client.play(ply.card.name, ply.row, ply.column)
+            state = await client.wait_for_turn()
+            waits.append(time.time() - t)
+        client.close()
+        return state['scores'], max(waits)
+
+    async with GameServer(time_budget=time_budget) as server:
+        results = await asyncio.gather(*(play_one(server, i) for i in range(games)))
+    for scores, wait in results:
+        print(scores, 'longest wait {:.2f}s'.format(wait))
+
+
+if __name__ == '__main__':
+    asyncio.run(demo())
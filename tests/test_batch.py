@@ -0,0 +1,45 @@
+import random
+
+import pytest
+
+import curling2
+
+np = pytest.importorskip('numpy')
+import batch  # noqa: E402
+
+
+def random_position(board, seed, plies):
+    random.seed(seed)
+    players = [curling2.AIPlayer(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    game = curling2.Game(curling2.StartGameState(board, players), save=0, load=0, autostart=False)
+    for _ in range(plies):
+        game.make_move(game.players[game.p_turn].make_move(game.get_game_state()))
+    return game
+
+
+@pytest.mark.parametrize('board', [curling2.Board, curling2.CompactBoard])
+@pytest.mark.parametrize('plies', [0, 5, 12, 20, 31, 38])
+def test_batch_scores_every_child_as_test_move(board, plies, monkeypatch):
+    """child_values and greedy_scores of every ply, card_options 3 so several cards are played, give what playing
+    each ply with test_move and scoring the board gives"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game = random_position(board(), plies, plies)
+    p_turn = game.p_turn
+    game.players[p_turn].card_options = 3
+    players = game.players
+    alter_scores = {player: random.randrange(20) for player in players}
+    plies = list(curling2.Player.enum_plies(game, p_turn))
+    values = batch.child_values(game, p_turn, alter_scores, plies)
+    greedy = batch.greedy_scores(game.board.codes(players), game.board.size,
+                                 [(batch.player_code(ply.card, p_turn), ply.row, ply.column) for ply in plies],
+                                 len(players), p_turn)
+    for i, ply in enumerate(plies):
+        new_alter_scores, new_p_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy())
+        if values is None:
+            assert gameover
+        else:
+            expected = curling2.AITreeSearch.heuristic_eval(game, new_alter_scores, new_p_turn, gameover)
+            assert values[i] == pytest.approx(expected)
+        board_scores = [game.board.score(player) for player in players]
+        game.untest_move(token)
+        assert greedy[i] == 2 * board_scores[p_turn] - sum(board_scores)
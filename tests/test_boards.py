@@ -0,0 +1,76 @@
+import random
+
+import pytest
+
+import curling2
+
+BOARDS = [curling2.Board, curling2.CompactBoard]
+
+
+def new_players():
+    return [curling2.Player(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+
+
+def fill_setup(board, players):
+    """Plays the setup phase, each empty cell taking the next player's first card"""
+    for i, (row, column) in enumerate(board.get_empty()):
+        player = players[i % len(players)]
+        card = player.hand[0]
+        player.play(card)
+        assert board.update(curling2.Ply(card, row, column))[1] == ''
+
+
+@pytest.mark.parametrize('board_cls', BOARDS)
+def test_boards_share_no_card_state(board_cls):
+    players = new_players()
+    board, other = board_cls(), board_cls()
+    empty = other.get_empty()
+    token, error = board.make_move(curling2.Ply(players[0].hand[0], *empty[0]))
+    assert board.get_empty() == empty[1:] and other.get_empty() == empty
+    board.unmake_move(token)
+    assert board.get_empty() == empty
+
+    fill_setup(board, players)
+    assert not board.get_empty() and other.get_empty() == empty
+    # The top row's middle cell starts as filler, pushed off by inserting into column 3 from the bottom
+    discarded, error = board.update(curling2.Ply(players[0].hand[0], 6, 3), test=True)
+    assert discarded is curling2.FILLER_CARD and not discarded.played
+    assert other.get_empty() == empty
+
+
+def edge_plies(size):
+    return [(0, i) for i in range(1, size + 1)] + [(size + 1, i) for i in range(1, size + 1)] + \
+           [(i, 0) for i in range(1, size + 1)] + [(i, size + 1) for i in range(1, size + 1)]
+
+
+def assert_same_position(board, compact, players):
+    assert board.codes(players) == compact.codes(players)
+    assert board.get_empty() == compact.get_empty()
+    assert str(board) == str(compact)
+    for player in players:
+        assert board.score(player) == compact.score(player) == board.full_score(player)
+        assert board.positional(player) == compact.positional(player) == board.full_positional(player)
+    assert board.zobrist == compact.zobrist and board.canonical() == compact.canonical()
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_compact_board_plays_as_board(seed):
+    """Random games with random cards and plies, on the two boards side by side"""
+    rng = random.Random(seed)
+    players = new_players()
+    board, compact = curling2.Board(), curling2.CompactBoard(players=players)
+    assert_same_position(board, compact, players)
+    for i in range(3 * len(curling2.RANKS)):
+        player = players[i % len(players)]
+        card = rng.choice(player.hand)
+        player.play(card)
+        row, column = rng.choice(board.get_empty() or edge_plies(board.size))
+        discarded, error = board.update(curling2.Ply(card, row, column))
+        compact_discarded, compact_error = compact.update(curling2.Ply(card, row, column))
+        assert error == compact_error == ''
+        assert str(discarded) == str(compact_discarded) and discarded.player is compact_discarded.player
+        assert_same_position(board, compact, players)
+    # The joker's row during setup, and a corner once the board is full
+    assert curling2.Board().update(curling2.Ply(card, 3, 0)) == curling2.CompactBoard().update(curling2.Ply(card, 3, 0))
+    assert board.update(curling2.Ply(card, 0, 0)) == compact.update(curling2.Ply(card, 0, 0)) == \
+        ('', 'Invalid row/column')
@@ -0,0 +1,20 @@
+import os
+import subprocess
+import sys
+
+import curling
+
+
+def test_unsaved_turn_leaves_session_alone(tmp_path):
+    fname = str(tmp_path / 'game.pi')
+    curling.setup(fname)
+    assert curling.turn('K', 1, 1, save=0, fname=fname) == 'Done'
+    board, players, discarded, p_turn, statement = curling.load(fname)
+    assert len(players[0].hand) == 13 and p_turn == 0 and board.get_empty()[0] == (1, 1)
+
+
+def test_curling_plays_without_curling2():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    out = subprocess.run([sys.executable, '-c', 'import sys, curling; print("curling2" in sys.modules)'], cwd=root,
+                         capture_output=True, text=True, check=True).stdout
+    assert out.strip() == 'False'
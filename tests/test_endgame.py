@@ -0,0 +1,64 @@
+import random
+
+import pytest
+
+import curling2
+import endgame
+import playout
+
+
+def late_position(seed, plies_left, card_options):
+    random.seed(seed)
+    players = [curling2.AIPlayer(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+    while sum(len(player.hand) for player in game.players) > plies_left:
+        game.make_move(game.players[game.p_turn].make_move(game.get_game_state()))
+    for player in game.players:
+        player.card_options = card_options
+    return game
+
+
+def maxn(game, p_turn, alter_scores):
+    """Final scores of max^n on the game itself, each seat playing the first ply best by endgame.utility"""
+    best = None
+    for ply in curling2.Player.enum_plies(game, p_turn):
+        child_scores, child_turn, gameover, token = game.test_move(ply, p_turn, alter_scores.copy())
+        if gameover:
+            scores = tuple(player.score + child_scores[player] for player in game.players)
+        else:
+            scores = maxn(game, child_turn, child_scores)
+        game.untest_move(token)
+        if best is None or endgame.utility(scores, p_turn) > endgame.utility(best, p_turn):
+            best = scores
+    return best
+
+
+@pytest.mark.parametrize('card_options', [1, 2])
+@pytest.mark.parametrize('seed', range(4))
+def test_solver_matches_maxn_on_the_game(seed, card_options, monkeypatch):
+    """EndgameSolver on a PlayoutState finds the final scores max^n finds playing test_move on the Game, and its best
+    moves lead to scores worth as much to the seat to play"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game = late_position(seed, 3, card_options)
+    expected = maxn(game, game.p_turn, {player: 0 for player in game.players})
+    state = playout.PlayoutState.from_game(game)
+    scores, moves = endgame.EndgameSolver().solve(state, [card_options] * len(game.players))
+    assert scores == expected
+    for move, rank in moves:
+        child = state.copy()
+        child.play(move, rank)
+        if not child.gameover:
+            child.scores = list(endgame.EndgameSolver().solve(child, [card_options] * len(game.players))[0])
+        assert endgame.utility(child.scores, game.p_turn) == endgame.utility(expected, game.p_turn)
+
+
+def test_search_plays_a_solved_ply(monkeypatch):
+    """In the endgame AITreeSearch plays one of the solver's best plies"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game = late_position(0, 4, 1)
+    searcher = curling2.AITreeSearch('T', '', 1, endgame_plies=4)
+    assert searcher.in_endgame(game)
+    ply = searcher.search(game, 1, game.p_turn, {player: 0 for player in game.players})[1]
+    state = playout.PlayoutState.from_game(game)
+    moves = endgame.EndgameSolver().solve(state)[1]
+    assert (state.move(ply.row, ply.column), curling2.RANK_INDEX[ply.card.name]) in moves
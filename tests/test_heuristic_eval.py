@@ -0,0 +1,60 @@
+import contextlib
+import io
+import random
+
+import pytest
+
+import curling2
+
+
+def full_heuristic_eval(game, alter_scores, p_turn, gameover):
+    """heuristic_eval adding up the positional term from the whole board, in floats as it used to"""
+    if gameover:
+        return curling2.AITreeSearch.heuristic_eval(game, alter_scores, p_turn, gameover)
+    board = game.board
+    num_players = len(game.players)
+    values = {p: 0 for p in game.players}
+    values[None] = 0  # Catch non player cards
+    central = (board.size // 2 - 1, board.size // 2, board.size // 2 + 1)
+    edges = [0, board.size - 1]
+    for r in edges:
+        for c in edges:
+            card = board.card_at(r, c)
+            values[card.player] += 0.2 * card.value
+        for c in central:
+            card = board.card_at(r, c)
+            values[card.player] += 0.5 * card.value
+    for c in edges:
+        for r in central:
+            card = board.card_at(r, c)
+            values[card.player] += 0.5 * card.value
+    del values[None]
+    for i, player in enumerate(game.players):
+        waittime = (i - p_turn) % num_players
+        score = player.score + alter_scores[player]
+        values[player] += score + board.score(player) * (1 + num_players - waittime)
+    s = sum(values.values())
+    return {k: 2 * v - s for k, v in values.items()}
+
+
+@pytest.mark.parametrize('board_cls', [curling2.Board, curling2.CompactBoard])
+def test_heuristic_eval_matches_full_eval(board_cls, monkeypatch):
+    """Every leaf a game of depth 1 searches evaluates as the whole board scan does"""
+    checked = []
+
+    def checked_eval(game, alter_scores, p_turn, gameover):
+        values = curling2.AITreeSearch.heuristic_eval(game, alter_scores, p_turn, gameover)
+        expected = full_heuristic_eval(game, alter_scores, p_turn, gameover)
+        assert all(abs(values[p] - expected[p]) < 1e-9 for p in game.players), game.board
+        checked.append(1)
+        return values
+
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    random.seed(0)
+    players = [curling2.AITreeSearch(name, suit, 1, 2, table_size=0, book=False, batch=False)
+               for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    for player in players:
+        player.heuristic_eval = checked_eval
+    with contextlib.redirect_stdout(io.StringIO()):
+        curling2.Game(curling2.StartGameState(board_cls(), players), save=0, load=0)
+    assert checked
@@ -0,0 +1,33 @@
+import random
+
+import curling2
+
+
+def new_game(fname, load):
+    players = [curling2.AIPlayer('A', 'h'), curling2.AIPlayer('B', 'd'), curling2.AIPlayer('C', 'c')]
+    return curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), fname=fname, load=load,
+                         autostart=False, journal=True, checkpoint_every=4)
+
+
+def same(a, b):
+    return a.board.codes(a.players) == b.board.codes(b.players) and a.p_turn == b.p_turn and \
+        [p.score for p in a.players] == [p.score for p in b.players] and \
+        [[c.name for c in p.hand] for p in a.players] == [[c.name for c in p.hand] for p in b.players]
+
+
+def test_undo_after_checkpoint_reloads(tmp_path, monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    random.seed(0)
+    fname = str(tmp_path / 'game.pi')
+    game = new_game(fname, 0)
+    for _ in range(3):
+        game.turn()
+    game.turn()  # The fourth record is a checkpoint
+    assert game.checkpoint_seq == game.journal_seq
+    game.unmake_move()
+    assert same(game, new_game(fname, 1))
+    game.turn()
+    game.unmake_move()
+    game.unmake_move()
+    game.turn()
+    assert same(game, new_game(fname, 1))
@@ -0,0 +1,40 @@
+import random
+
+import pytest
+
+import curling2
+
+
+def position(game):
+    """Everything a ply and its undo touch"""
+    board = game.board
+    return (game.snapshot(), board.zobrist, board.get_empty(), [board.score(p) for p in game.players],
+            [board.positional(p) for p in game.players], [list(p.hand) for p in game.players], game.p_turn,
+            len(game.plyhistory), game.gameover)
+
+
+@pytest.mark.parametrize('board_cls', [curling2.Board, curling2.CompactBoard])
+def test_every_ply_takes_back_exactly(board_cls):
+    """Every ply of every position of a random game is tested and taken back, then the game is undone to the
+    start"""
+    random.seed(3)
+    players = [curling2.AIPlayer(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    for player in players:
+        player.card_options = 3
+    game = curling2.Game(curling2.StartGameState(board_cls(), players), save=0, load=0, autostart=False)
+    positions = []
+    while not game.gameover:
+        before = position(game)
+        positions.append(before)
+        for ply in curling2.Player.enum_plies(game, game.p_turn):
+            alter_scores = {p: 0 for p in players}
+            token = game.test_move(ply, game.p_turn, alter_scores)[3]
+            assert position(game) != before
+            game.untest_move(token)
+            assert position(game) == before, ply
+        assert game.make_move(players[game.p_turn].make_move(game.get_game_state())) == 'Done'
+    assert len(positions) == 3 * len(curling2.RANKS)
+    for before in reversed(positions):
+        game.unmake_move()
+        assert position(game) == before
+    assert all(p.score == 0 for p in players)
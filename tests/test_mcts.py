@@ -0,0 +1,41 @@
+import random
+
+import curling2
+
+
+def mcts_game(seed, **options):
+    random.seed(seed)
+    players = [curling2.AIMCTSPlayer('M', chr(9829), **options),
+               curling2.AIPlayer('B', chr(9830)), curling2.AIPlayer('C', chr(9827))]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+    return game, players[0]
+
+
+def test_mcts_plays_legal_plies_and_reuses_its_tree(monkeypatch):
+    """Every ply AIMCTSPlayer picks is one enum_plies lists, the root gets the iterations on top of the visits kept
+    from the last move, and after the first move some are kept"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game, mcts = mcts_game(0, iterations=60)
+    reused = []
+    while not game.gameover:
+        player = game.players[game.p_turn]
+        ply = player.make_move(game.get_game_state())
+        if player is mcts:
+            legal = {(p.card.name, p.row, p.column) for p in curling2.Player.enum_plies(game, game.p_turn)}
+            assert (ply.card.name, ply.row, ply.column) in legal
+            root = mcts.tree.parent
+            assert root.visits == mcts.reused + 60
+            reused.append(mcts.reused)
+        game.make_move(ply)
+    assert reused[0] == 0
+    assert any(reused[1:])
+
+
+def test_mcts_without_reuse_starts_each_move_afresh(monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game, mcts = mcts_game(1, iterations=30, reuse=False)
+    for _ in range(9):
+        player = game.players[game.p_turn]
+        game.make_move(player.make_move(game.get_game_state()))
+        if player is mcts:
+            assert mcts.reused == 0 and mcts.tree is None
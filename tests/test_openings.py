@@ -0,0 +1,62 @@
+import random
+
+import pytest
+
+import curling2
+import openings
+
+
+def standard_game(seed, players=None):
+    random.seed(seed)
+    players = players or [curling2.AIPlayer('P{}'.format(i), suit) for i, suit in enumerate(openings.SUITS)]
+    return curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+
+
+@pytest.mark.parametrize('seed', range(2))
+def test_book_plies_are_legal_and_best(seed, monkeypatch):
+    """Along games played from the book, every position it covers is in it, and each of its plies is a legal ply of
+    the mover's highest card searched as good as the best at the book's depth"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    book = openings.default_book()
+    if not len(book):
+        pytest.skip('no opening book built')
+    game = standard_game(seed)
+    for _ in range(book.plies):
+        p_turn = game.p_turn
+        plies = book.lookup(game.board.codes(game.players), p_turn)
+        assert plies
+        highest = curling2.RANK_INDEX[game.players[p_turn].hand[0].name]
+        searcher = curling2.AITreeSearch('T', '', book.depth)
+        alter_scores = {player: 0 for player in game.players}
+        best = max(value for _, value in searcher.score_plies(game, book.depth, p_turn, alter_scores,
+                                                               searcher.root_plies(game, p_turn)))
+        for rank, row, column in plies:
+            assert rank == highest
+            assert (row, column) in game.board.get_empty()
+            ply = curling2.Ply(game.players[p_turn].in_hand(curling2.RANKS[rank]), row, column)
+            assert searcher.score_plies(game, book.depth, p_turn, alter_scores, [ply])[0][1] == best
+        rank, row, column = random.choice(plies)
+        game.make_move(curling2.Ply(game.players[p_turn].in_hand(curling2.RANKS[rank]), row, column))
+    assert book.lookup(game.board.codes(game.players), game.p_turn) is None
+
+
+def test_book_survives_dumps_and_loads():
+    book = openings.default_book()
+    copy = openings.OpeningBook.loads(book.dumps())
+    assert (copy.entries, copy.plies, copy.depth) == (book.entries, book.plies, book.depth)
+
+
+@pytest.mark.parametrize('book, card_options, from_book', [(True, 1, True), (True, 2, False), (False, 1, False)])
+def test_search_plays_from_the_book_only_when_asked(book, card_options, from_book, monkeypatch):
+    """AITreeSearch takes its first ply from the book, searching no nodes, only with book=True and card_options 1"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    if not len(openings.default_book()):
+        pytest.skip('no opening book built')
+    searcher = curling2.AITreeSearch('P0', openings.SUITS[0], 1, card_options=card_options, book=book)
+    players = [searcher] + [curling2.AIPlayer('P{}'.format(i), suit) for i, suit in enumerate(openings.SUITS[1:], 1)]
+    game = standard_game(0, players)
+    ply = searcher.make_move(game.get_game_state())
+    assert (searcher.nodes == 0) == from_book
+    if from_book:
+        plies = openings.default_book().lookup(game.board.codes(game.players), 0)
+        assert (curling2.RANK_INDEX[ply.card.name], ply.row, ply.column) in plies
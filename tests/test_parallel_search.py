@@ -0,0 +1,48 @@
+import contextlib
+import io
+import random
+
+import curling2
+
+
+def midgame(plies=16):
+    """Game, not started, after plies random plies"""
+    random.seed(1)
+    players = [curling2.AIPlayer(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+    for _ in range(plies):
+        game.make_move(game.players[game.p_turn].make_move(game.get_game_state()))
+    return game
+
+
+def test_workers_search_with_the_parent_options(monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    parent = curling2.AITreeSearch('T', '', 2, 2, mode='paranoid', table_size=64, endgame_plies=0, symmetry=False,
+                                   ordering=False, batch=False, workers=2)
+    worker = curling2.AITreeSearch('worker', '', 2, **parent.worker_options())
+    for name in ('card_options', 'mode', 'endgame_plies', 'symmetry', 'ordering', 'batch'):
+        assert getattr(worker, name) == getattr(parent, name)
+    assert worker.table.size == 64 and worker.workers is None
+
+    game = midgame()
+    alter_scores = {player: 0 for player in game.players}
+    plies = parent.root_plies(game, game.p_turn)
+    expected = [value for _, value in parent.score_plies(game, 1, game.p_turn, alter_scores, plies)]
+    keys = [(ply.card.name, ply.row, ply.column) for ply in plies]
+    values, nodes = curling2.search_root_plies(game.snapshot(alter_scores), keys, 1, parent.worker_options(), None)
+    assert values == expected and nodes
+
+
+def test_parallel_search_finds_the_serial_value(monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game = midgame()
+    alter_scores = {player: 0 for player in game.players}
+    options = dict(mode='paranoid', table_size=0, endgame_plies=0)
+    serial = curling2.AITreeSearch('T', '', 1, **options)
+    parallel = curling2.AITreeSearch('T', '', 1, workers=2, **options)
+    with contextlib.redirect_stdout(io.StringIO()):
+        value = serial.root_search(game, 1, game.p_turn, alter_scores)[0]
+        assert parallel.parallel_search(game, 1, game.p_turn, alter_scores)[0] == value
+    assert 2 in curling2._pools
+    curling2.shutdown_pools()
+    assert not curling2._pools
@@ -0,0 +1,48 @@
+import random
+
+import pytest
+
+import curling2
+import playout
+
+
+@pytest.mark.parametrize('seed', range(5))
+def test_playout_state_plays_as_the_game(seed, monkeypatch):
+    """The same plies played on a CompactBoard Game and a PlayoutState leave the same cells, scores, turn and legal
+    moves after every ply"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    random.seed(seed)
+    players = [curling2.AIPlayer(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+    state = playout.PlayoutState.from_game(game)
+    while not game.gameover:
+        legal = {(ply.row, ply.column) for ply in curling2.Player.enum_plies(game, game.p_turn)}
+        assert {state.ply(move) for move in state.moves()} == legal
+        ply = game.players[game.p_turn].make_move(game.get_game_state())
+        state.play(state.move(ply.row, ply.column), curling2.RANK_INDEX[ply.card.name])
+        game.make_move(ply)
+        assert state.cells == game.board.codes(game.players)
+        assert state.scores == [player.score for player in game.players]
+        assert state.p_turn == game.p_turn
+    assert state.gameover
+
+
+@pytest.mark.parametrize('policy', playout.POLICIES)
+def test_policies_choose_legal_moves(policy):
+    rng = random.Random(0)
+    for _ in range(20):
+        state = playout.PlayoutState.start()
+        while not state.gameover:
+            move = state.choose(policy, rng)
+            assert move in state.moves()
+            state.play(move)
+        assert not any(state.hands)
+
+
+def test_copy_plays_out_apart():
+    state = playout.PlayoutState.start()
+    for _ in range(3):
+        state.play(state.moves()[0])
+    before = (state.cells[:], state.hands[:], state.scores[:], state.p_turn)
+    state.copy().playout('random', random.Random(0))
+    assert (state.cells, state.hands, state.scores, state.p_turn) == before
@@ -0,0 +1,72 @@
+import os
+import pickle
+
+import pytest
+
+import curling2
+import savefile
+
+
+def round_trip(players):
+    state = curling2.StartGameState(curling2.CompactBoard(), players)
+    return savefile.loads_game_state(savefile.dumps_game_state(state))[0].players
+
+
+def test_search_players_keep_their_settings():
+    tree = curling2.AITreeSearch('T', 'h', 3, card_options=2, mode='brs', time_budget=0.5, endgame_plies=0,
+                                 symmetry=False, book=True, ordering=False, batch=False)
+    mcts = curling2.AIMCTSPlayer('M', 'd', iterations=50, time_limit=0.25, policy='greedy', exploration=0.7,
+                                 score_weight=0.3, card_options=2, reuse=False)
+    loaded_tree, loaded_mcts = round_trip([tree, mcts])
+    assert type(loaded_tree) is curling2.AITreeSearch and type(loaded_mcts) is curling2.AIMCTSPlayer
+    for name in ('depth', 'card_options', 'mode', 'time_budget', 'endgame_plies', 'symmetry', 'book', 'ordering',
+                 'batch'):
+        assert getattr(loaded_tree, name) == getattr(tree, name), name
+    for name in ('iterations', 'time_limit', 'policy', 'exploration', 'score_weight', 'card_options', 'reuse'):
+        assert getattr(loaded_mcts, name) == getattr(mcts, name), name
+
+
+def test_pickle_saves_only_load_once_converted(tmp_path):
+    fname = str(tmp_path / 'game.pi')
+    players = [curling2.AIPlayer('A', 'h'), curling2.AIPlayer('B', 'd')]
+    with open(fname, 'wb') as f:
+        pickle.dump(curling2.StartGameState(curling2.CompactBoard(), players), f)
+    game = curling2.Game(curling2.StartGameState(), fname=fname, save=0, load=0, autostart=False)
+    with pytest.raises(Exception, match='not a binary save'):
+        game.load()
+    assert savefile.convert(fname)
+    assert [p.name for p in game.load().players] == ['A', 'B']
+
+
+def test_baseline_pickle_converts(tmp_path):
+    """data/baseline_game.pi is a pickle save written by curling2 before any of the search options: an AIPlayer, an
+    AITreeSearch of depth 1 and a HumanPlayer, five plies into a game"""
+    fname = str(tmp_path / 'game.pi')
+    with open(os.path.join(os.path.dirname(__file__), 'data', 'baseline_game.pi'), 'rb') as f:
+        data = f.read()
+    with open(fname, 'wb') as f:
+        f.write(data)
+    assert savefile.convert(fname)
+    game = curling2.Game(curling2.StartGameState(), fname=fname, save=0, load=1, autostart=False)
+    ai, tree, human = game.players
+    assert [type(p).__name__ for p in game.players] == ['AIPlayer', 'AITreeSearch', 'HumanPlayer']
+    assert ai.gm == 'r' and tree.depth == 1 and tree.mode == 'maxn' and tree.endgame_plies == 4
+    assert [len(p.hand) for p in game.players] == [11, 11, 12] and game.p_turn == 2
+    row, column = game.board.get_empty()[0]
+    assert game.make_move(curling2.Ply(human.hand[0], row, column)) == 'Done'
+    for player in (ai, tree):
+        assert game.make_move(player.make_move(game.get_game_state())) == 'Done'
+
+
+@pytest.mark.parametrize('board_cls', [curling2.Board, curling2.CompactBoard])
+def test_rejected_plies_do_not_reach_the_save(tmp_path, board_cls, monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    players = [curling2.HumanPlayer('A', 'h'), curling2.HumanPlayer('B', 'd')]
+    game = curling2.Game(curling2.StartGameState(board_cls(), players), fname=str(tmp_path / 'game.pi'), save=1,
+                         load=0, autostart=False)
+    for row, column in ((-1, 3), (1, 300), (3, 3)):
+        assert game.make_move(curling2.Ply(players[0].hand[0], row, column)) != 'Done'
+    assert game.plyhistory == []
+    row, column = game.board.get_empty()[0]
+    assert game.make_move(curling2.Ply(players[0].hand[0], row, column)) == 'Done'
+    assert len(game.load().plyhistory) == 1
@@ -0,0 +1,19 @@
+import contextlib
+import io
+
+import curling2
+
+
+def test_search_modes_against_maxn(monkeypatch):
+    """Shallow pruning plays as max^n with fewer nodes. Paranoid and best-reply search value positions their own
+    way, so they only have to pick a ply max^n rates best some of the time, and search far less"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    positions = 10
+    with contextlib.redirect_stdout(io.StringIO()):
+        results = curling2.compare_search_modes(positions)
+    maxn_nodes = results['maxn'][0]
+    assert results['maxn'][1] == results['shallow'][1] == positions
+    assert results['shallow'][0] <= maxn_nodes
+    assert results['paranoid'][1] >= 0.5 * positions and results['paranoid'][0] <= 0.25 * maxn_nodes
+    assert results['brs'][1] >= 0.3 * positions and results['brs'][0] <= 0.25 * maxn_nodes
+    assert not curling2.PRINT
@@ -0,0 +1,41 @@
+import contextlib
+import io
+import random
+
+import curling2
+
+
+def test_effective_branching_of_uniform_trees():
+    stats = curling2.SearchStats()
+    stats.trees = [(3 + 9, 2), (3, 1)]
+    assert abs(stats.effective_branching() - 3) < 1e-9
+    stats.trees.append((2 + 4 + 8, 3))
+    assert abs(stats.effective_branching() - 8 / 3) < 1e-9
+
+
+def searched_stats(depth):
+    """Stats of the first player's first move, searching to depth plies after its own"""
+    random.seed(0)
+    players = [curling2.AITreeSearch(name, suit, depth, table_size=0, stats=True, endgame_plies=0, symmetry=False)
+               for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+    with contextlib.redirect_stdout(io.StringIO()):
+        players[0].make_move(game.get_game_state())
+    return players[0].game_stats, len(list(curling2.Player.enum_plies(game, 0)))
+
+
+def test_one_ply_search_branches_into_every_root_ply(monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    stats, plies = searched_stats(0)
+    assert stats.nodes_by_ply == [plies] and stats.trees == [(plies, 1)]
+    assert stats.branching() == [plies]
+    assert abs(stats.effective_branching() - plies) < 1e-6
+
+
+def test_effective_branching_solves_for_the_searched_tree(monkeypatch):
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    stats, plies = searched_stats(1)
+    nodes = sum(stats.nodes_by_ply)
+    assert stats.trees == [(nodes, 2)] and stats.nodes_by_ply[0] == plies
+    b = stats.effective_branching()
+    assert abs(b + b ** 2 - nodes) < 1e-6
@@ -0,0 +1,59 @@
+import asyncio
+import logging
+import random
+
+import pytest
+
+import curling2
+import server
+
+
+def players():
+    return [curling2.Player('Human', chr(9829)), curling2.AIPlayer('Random', chr(9830)),
+            curling2.AITreeSearch('Tree', chr(9827), 1, table_size=0)]
+
+
+async def play_out(game_server, game_id):
+    """Plays the human seat's first legal ply until the game ends, returning the final state and the game"""
+    client = server.LocalClient(game_server, game_id)
+    state = await client.wait_for_turn(timeout=30)
+    while not state['gameover']:
+        game = game_server.session(game_id).game
+        ply = next(curling2.Player.enum_plies(game, game.p_turn))
+        assert await client.play(ply.card.name, ply.row, ply.column) == 'Done'
+        state = await client.wait_for_turn(timeout=30)
+    client.close()
+    return state, game_server.session(game_id).game
+
+
+def test_full_game_through_local_client(capsys):
+    async def main():
+        async with server.GameServer(time_budget=0.2) as game_server:
+            game_id = game_server.new_game(players())
+            return await play_out(game_server, game_id)
+
+    random.seed(0)
+    state, game = asyncio.run(main())
+    assert state['gameover'] and state['ply'] == len(game.plyhistory) == 3 * len(curling2.RANKS)
+    assert state['scores'] == {str(player): player.score for player in game.players}
+    assert not any(player.hand for player in game.players)
+    # The AI plies neither print nor switch printing back on for the next game
+    assert capsys.readouterr().out == '' and not curling2.PRINT
+
+
+def test_failed_ai_turn_is_logged_and_reported(caplog):
+    class Broken(curling2.AIPlayer):
+        def make_move(self, game_state):
+            raise Exception('Broken search')
+
+    async def main():
+        async with server.GameServer() as game_server:
+            game_id = game_server.new_game([Broken('Broken', chr(9829)), curling2.Player('Human', chr(9830))])
+            client = server.LocalClient(game_server, game_id)
+            with pytest.raises(Exception, match='Broken search'):
+                await client.wait_for_turn(timeout=30)
+            await asyncio.sleep(0)
+
+    with caplog.at_level(logging.ERROR, logger='server'):
+        asyncio.run(main())
+    assert any('AI turns failed' in record.message for record in caplog.records)
@@ -0,0 +1,10 @@
+import pytest
+
+import tournament
+
+
+def test_legacy_engine_rejects_curling2_specs():
+    with pytest.raises(ValueError):
+        tournament.play_game(['tree:2', 'mcts:50', 'r'], 1, engine='curling')
+    with pytest.raises(ValueError):
+        next(tournament.run(['greedy', 'greedy', 'tree'], 1, engine='curling'))
@@ -0,0 +1,38 @@
+import random
+
+import pytest
+
+import curling2
+
+
+def random_position(seed, plies):
+    random.seed(seed)
+    players = [curling2.AIPlayer(name, suit) for name, suit in (('A', chr(9829)), ('B', chr(9830)), ('C', chr(9827)))]
+    game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0, autostart=False)
+    for _ in range(plies):
+        game.make_move(game.players[game.p_turn].make_move(game.get_game_state()))
+    return game
+
+
+def root_value(searcher, game, depth):
+    alter_scores = {p: 0 for p in game.players}
+    value = searcher.search(game, depth, game.p_turn, alter_scores, endgame=False)[0]
+    return value[game.players[game.p_turn]] if isinstance(value, dict) else value
+
+
+@pytest.mark.parametrize('mode', ['maxn', 'paranoid', 'shallow'])  # Best-reply search keeps no table
+@pytest.mark.parametrize('plies', [2, 20])
+def test_table_keeps_the_search_value(mode, plies, monkeypatch):
+    """Searches with a transposition table value the root as without one, in the setup phase (where the table keys
+    positions under symmetry) and after: with a small table, where keys share slots, after a shallower search has
+    filled it, and when searched again so the root is answered from it"""
+    monkeypatch.setattr(curling2, 'PRINT', False)
+    game = random_position(plies, plies)
+    expected = [root_value(curling2.AITreeSearch('T', '', depth, mode=mode, table_size=0), game, depth)
+                for depth in (1, 2)]
+    for table_size in (16, 2 ** 12):
+        searcher = curling2.AITreeSearch('T', '', 2, mode=mode, table_size=table_size)
+        for depth in (1, 2, 2):
+            searcher.table.new_search()
+            assert root_value(searcher, game, depth) == pytest.approx(expected[depth - 1])
+        assert searcher.table.hits
@@ -0,0 +1,131 @@
+"""Self-play tournaments between AI line-ups, played over a process pool with one seed per game so any game can be
+replayed. A line-up is one spec per seat:
+
+    'r', 'r1', 'r2'             random placement, optionally restricted (the curling.py gm modes)
+    'greedy'                    one step greedy, as curling.one_set_ai
+    'tree[:depth[:card_options[:mode]]]'
+                                AITreeSearch, e.g. 'tree:3:2:paranoid'
+    'mcts[:iterations[:policy]]'
+                                AIMCTSPlayer, e.g. 'mcts:500:random'
+
+engine='curling' plays line-ups of the random and greedy specs through curling.py itself instead."""
+import contextlib
+import io
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import curling
+import curling2
+
+NAMES = ['Matt', 'F. Rob', 'Rob H.']
+SUITS = [chr(9829), chr(9830), chr(9827)]
+LEGACY_SPECS = ('r', 'r1', 'r2', 'greedy')  # What curling.py's AI can play
+
+
+def make_player(spec, name, suit):
+    kind, *args = spec.split(':')
+    if kind in ('r', 'r1', 'r2'):
+        return curling2.AIPlayer(name, suit, gm=kind)
+    elif kind == 'greedy':
+        return curling2.AIGreedyPlayer(name, suit)
+    elif kind == 'tree':
+        depth = int(args[0]) if len(args) > 0 else 2
+        card_options = int(args[1]) if len(args) > 1 else 1
+        mode = args[2] if len(args) > 2 else 'maxn'
+        return curling2.AITreeSearch(name, suit, depth, card_options, mode)
+    elif kind == 'mcts':
+        iterations = int(args[0]) if len(args) > 0 else 300
+        policy = args[1] if len(args) > 1 else 'random'
+        return curling2.AIMCTSPlayer(name, suit, iterations, policy=policy)
+    raise Exception('Unknown player spec {}'.format(spec))
+
+
+def check_lineup(lineup, engine):
+    if engine == 'curling':
+        unsupported = [spec for spec in lineup if spec not in LEGACY_SPECS]
+        if unsupported:
+            raise ValueError('engine curling only plays {}, not {}'.format(LEGACY_SPECS, unsupported))
+
+
+def play_game(lineup, seed, engine='curling2'):
+    """Plays one game from seed, returning (seed, final scores by seat)"""
+    check_lineup(lineup, engine)
+    random.seed(seed)
+    if engine == 'curling':
+        gm = ['' if spec == 'greedy' else spec for spec in lineup]
+        curling.PRINT = False
+        return seed, curling.main((1,) * len(lineup), gm)
+    players = [make_player(spec, NAMES[i % len(NAMES)], SUITS[i % len(SUITS)]) for i, spec in enumerate(lineup)]
+    # AITreeSearch prints on every move and switches printing back on, so keep the game's output out of the way
+    with contextlib.redirect_stdout(io.StringIO()):
+        curling2.PRINT = False
+        game = curling2.Game(curling2.StartGameState(curling2.CompactBoard(), players), save=0, load=0)
+    return seed, [player.score for player in game.players]
+
+
+class Results:
+    """Running totals of a tournament"""
+    def __init__(self, lineup):
+        self.lineup = list(lineup)
+        n = len(lineup)
+        self.games = 0
+        self.wins = [0] * n  # Shared wins count for every winner
+        self.totals = [0] * n
+        self.margins = [0] * n  # Seat i's score minus the next seat's
+        self.winning_total = 0
+
+    def add(self, scores):
+        self.games += 1
+        m = max(scores)
+        for i, score in enumerate(scores):
+            if score == m:
+                self.wins[i] += 1
+            self.totals[i] += score
+            self.margins[i] += score - scores[(i + 1) % len(scores)]
+        self.winning_total += m
+
+    def mean_scores(self):
+        return [total / self.games for total in self.totals]
+
+    def mean_margins(self):
+        return [margin / self.games for margin in self.margins]
+
+    def summary(self):
+        return '\n'.join(['{} games of {}'.format(self.games, self.lineup),
+                          'Wins {}'.format(self.wins),
+                          'Av score {}'.format(['{:.2f}'.format(s) for s in self.mean_scores()]),
+                          'Margins: {}'.format(['{:.2f}'.format(m) for m in self.mean_margins()]),
+                          'Av winning score: {:.2f}'.format(self.winning_total / self.games)])
+
+
+def run(lineup, games, workers=None, seed=0, engine='curling2'):
+    """Plays games seeded seed, seed + 1, ... over a pool of workers processes, yielding (seed, scores, results)
+    as each game finishes. Results only depend on the seeds, not on the number of workers or finishing order"""
+    check_lineup(lineup, engine)
+    results = Results(lineup)
+    pool = ProcessPoolExecutor(workers)
+    try:
+        futures = [pool.submit(play_game, lineup, seed + i, engine) for i in range(games)]
+        for future in as_completed(futures):
+            game_seed, scores = future.result()
+            results.add(scores)
+            yield game_seed, scores, results
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+def tournament(lineup, games, workers=None, seed=0, engine='curling2', report_every=None):
+    """Runs a tournament, printing the running summary every report_every games and the final one"""
+    results = Results(lineup)
+    for _, _, results in run(lineup, games, workers, seed, engine):
+        if report_every and results.games % report_every == 0 and results.games < games:
+            print(results.summary())
+            print()
+    print(results.summary())
+    print()
+    return results
+
+
+if __name__ == '__main__':
+    tournament(['greedy', 'greedy', 'greedy'], 1000, report_every=250)
+    tournament(['tree:1', 'greedy', 'r'], 100, report_every=25)